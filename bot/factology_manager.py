@@ -4,12 +4,15 @@ Factology Manager
 Handles the business logic for creating, retrieving, and managing structured facts.
 """
 
+import collections
 import logging
+import time
 from datetime import datetime, timezone, timedelta
 from typing import List
 
 from google.cloud import firestore
 from bot.prompt_builder import ReorganisationAction
+from config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -17,8 +20,14 @@ logger = logging.getLogger(__name__)
 class FactologyManager:
     """Manages fact-related operations"""
 
-    def __init__(self, firestore_client):
+    def __init__(self, firestore_client, prune_interval: float = None):
         self.firestore_client = firestore_client
+        # Pruning only drops facts older than 60 days, so once per interval is enough
+        self.prune_interval = (
+            Config.FACT_PRUNE_INTERVAL if prune_interval is None else prune_interval
+        )
+        # user_id -> monotonic time of the last pruning pass, oldest first
+        self._last_pruned = collections.OrderedDict()
 
     def save_new_fact(
         self, user_id: str, fact_content: str, category: str, priority: str
@@ -47,7 +56,7 @@ class FactologyManager:
                 hot=1.0,
             )
 
-            logger.info(f"Saved new fact for user {user_id}.")
+            logger.info("Saved new fact for user %s.", user_id)
 
             # Return fact data like in MVP
             return {
@@ -59,9 +68,7 @@ class FactologyManager:
             }
 
         except Exception as e:
-            logger.error(
-                f"Failed to save fact for user {user_id}: {str(e)}", exc_info=True
-            )
+            logger.error("Failed to save fact for user %s: %s", user_id, e, exc_info=True)
             raise
 
     def create_fact(
@@ -96,7 +103,7 @@ class FactologyManager:
                 created_by="therapist_ai",
             )
 
-            logger.info(f"Fact created for user {user_id}")
+            logger.info("Fact created for user %s", user_id)
             return "Fact recorded successfully."
 
         except Exception as e:
@@ -119,11 +126,9 @@ class FactologyManager:
                 self.firestore_client.update_fact_fields(
                     user_id, fact_id_str, {"hot": firestore.Increment(1)}
                 )
-                logger.info(f"Incremented hot score for fact {fact_id_str}")
+                logger.info("Incremented hot score for fact %s", fact_id_str)
             except Exception as e:
-                logger.error(
-                    f"Could not increment hot score for fact {fact_id_str}: {e}"
-                )
+                logger.error("Could not increment hot score for fact %s: %s", fact_id_str, e)
 
     def decay_hot_scores(self, user_id: str, referenced_fact_ids: List[int]):
         """
@@ -145,7 +150,7 @@ class FactologyManager:
                         user_id, fact_id, {"hot": new_hot_score}
                     )
         except Exception as e:
-            logger.error(f"Error during hot score decay for user {user_id}: {e}")
+            logger.error("Error during hot score decay for user %s: %s", user_id, e)
 
     def merge_facts(
         self, user_id: str, reorganisation_actions: List[ReorganisationAction]
@@ -169,7 +174,8 @@ class FactologyManager:
             )
             if len(facts_to_merge) < 2:
                 logger.warning(
-                    f"Could not find enough facts for merge action: {action.model_dump_json()}"
+                    "Could not find enough facts for merge action: %s",
+                    action.model_dump_json(),
                 )
                 continue
 
@@ -197,12 +203,25 @@ class FactologyManager:
             if ids_to_delete:
                 self.firestore_client.delete_facts_by_ids(user_id, ids_to_delete)
 
-            logger.info(f"Merged facts {ids_to_delete} into fact {heir_id}.")
+            logger.info("Merged facts %s into fact %s.", ids_to_delete, heir_id)
 
     def prune_facts(self, user_id: str):
         """
         Removes facts that are older than 60 days and have a low hot score.
+
+        Runs at most once per prune_interval for each user; later calls are skipped.
         """
+        now = time.monotonic()
+        # Forget users whose interval has passed, so only recently pruned users are kept
+        while self._last_pruned:
+            oldest = next(iter(self._last_pruned.values()))
+            if now - oldest < self.prune_interval:
+                break
+            self._last_pruned.popitem(last=False)
+        if user_id in self._last_pruned:
+            return
+        self._last_pruned[user_id] = now
+
         try:
             all_facts = self.firestore_client.get_facts(user_id)
             if not all_facts:
@@ -235,10 +254,9 @@ class FactologyManager:
             if facts_to_delete:
                 self.firestore_client.delete_facts_by_ids(user_id, facts_to_delete)
                 logger.info(
-                    f"Pruned {len(facts_to_delete)} old/cold facts for user {user_id}: {facts_to_delete}"
+                    "Pruned %d old/cold facts for user %s: %s",
+                    len(facts_to_delete), user_id, facts_to_delete,
                 )
 
         except Exception as e:
-            logger.error(
-                f"Error during fact pruning for user {user_id}: {e}", exc_info=True
-            )
+            logger.error("Error during fact pruning for user %s: %s", user_id, e, exc_info=True)
@@ -1,22 +1,37 @@
+import asyncio
 import logging
 from datetime import datetime, timezone
 from google.cloud import firestore
 from google.auth import default
 from google.auth.exceptions import DefaultCredentialsError, TransportError
+from google.api_core.exceptions import AlreadyExists
 import ssl
 import certifi
 import urllib3
 from config import Config
-from bot.retry_utils import retry_sync, retry_async
+from bot.retry_utils import NON_RETRYABLE_EXCEPTIONS, retry_sync, retry_async
 
 from google.cloud.firestore_v1.base_query import FieldFilter
 from typing import List, Dict, Any
+import itertools
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firestore client lazily
-db = None
+# Pool of Firestore clients, built once per process. Each client owns its own
+# gRPC channel, so spreading calls across several clients avoids the per-channel
+# concurrent stream cap under bursts.
+_pool = []
+_pool_counter = itertools.count()
+_pool_lock = threading.Lock()
+
+# In-process TTL caches of per-user documents: user_id -> (expires_at, value).
+# System prompts and settings change rarely, so most turns skip those Firestore reads.
+_system_prompt_cache = {}
+_user_settings_cache = {}
+USER_CACHE_MAX_SIZE = 10000
+_MISSING = object()
 
 def configure_ssl_context():
     """Configure SSL context for better compatibility"""
@@ -31,18 +46,33 @@ def configure_ssl_context():
         
         return ssl_context
     except Exception as e:
-        logger.warning(f"Could not configure SSL context: {e}")
+        logger.warning("Could not configure SSL context: %s", e)
         return None
 
-def get_db():
-    global db
-    if db is None:
+def init_db_pool():
+    """
+    Build the Firestore client pool if it does not exist yet.
+
+    Credentials are resolved once and shared by every client in the pool.
+
+    Returns:
+        list: The pooled Firestore clients
+    """
+    global _pool
+    with _pool_lock:
+        if _pool:
+            return _pool
+
         max_retries = 3
         retry_delay = 2
+        pool_size = max(1, Config.FIRESTORE_POOL_SIZE)
         
         for attempt in range(max_retries):
             try:
-                logger.info(f"Initializing Firestore client (attempt {attempt + 1}/{max_retries})")
+                logger.info(
+                    "Initializing Firestore client pool of %s (attempt %s/%s)",
+                    pool_size, attempt + 1, max_retries,
+                )
                 
                 # Configure SSL context
                 configure_ssl_context()
@@ -52,40 +82,55 @@ def get_db():
                     scopes=['https://www.googleapis.com/auth/cloud-platform']
                 )
                 
-                # Initialize Firestore client with explicit project
+                # Initialize Firestore clients with explicit project
                 project_id = Config.FIREBASE_PROJECT_ID or project
-                db = firestore.Client(
-                    project=project_id,
-                    credentials=credentials
-                )
+                clients = [
+                    firestore.Client(project=project_id, credentials=credentials)
+                    for _ in range(pool_size)
+                ]
                 
-                # Test the connection with a simple operation
+                # Test the connection with a simple read operation
                 logger.info("Testing Firestore connection...")
-                test_doc = db.collection('_connection_test').document('test')
-                test_doc.set({'timestamp': datetime.utcnow(), 'test': True}, merge=True)
+                clients[0].collection('_connection_test').document('test').get()
                 
-                logger.info("Firestore client initialized successfully")
-                return db
+                _pool = clients
+                logger.info("Firestore client pool initialized successfully")
+                return _pool
                 
             except (DefaultCredentialsError, TransportError) as e:
-                logger.error(f"Authentication error on attempt {attempt + 1}: {e}")
+                logger.error("Authentication error on attempt %s: %s", attempt + 1, e)
                 if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
+                    logger.info("Retrying in %s seconds...", retry_delay)
                     time.sleep(retry_delay)
                     retry_delay *= 2  # Exponential backoff
                 else:
                     logger.error("Failed to initialize Firestore client after all retries")
                     raise
             except Exception as e:
-                logger.error(f"Unexpected error initializing Firestore: {e}")
+                logger.error("Unexpected error initializing Firestore: %s", e)
                 if attempt < max_retries - 1:
-                    logger.info(f"Retrying in {retry_delay} seconds...")
+                    logger.info("Retrying in %s seconds...", retry_delay)
                     time.sleep(retry_delay)
                     retry_delay *= 2
                 else:
                     raise
     
-    return db
+    return _pool
+
+
+def get_db():
+    """Get a Firestore client from the pool, picking clients round-robin"""
+    pool = _pool or init_db_pool()
+    # Leave the first client to health probes unless it's the only one
+    if len(pool) > 1:
+        return pool[1 + next(_pool_counter) % (len(pool) - 1)]
+    return pool[0]
+
+
+def get_health_db():
+    """Get the Firestore client reserved for health probes"""
+    pool = _pool or init_db_pool()
+    return pool[0]
 
 
 @retry_sync()
@@ -119,17 +164,59 @@ def get_history(user_id):
         return history
 
     except Exception as e:
-        logger.error(f"Error retrieving history for user {user_id}: {str(e)}")
+        logger.error("Error retrieving history for user %s: %s", user_id, e)
+        return []
+
+
+@retry_sync()
+def get_recent_history(user_id, limit):
+    """
+    Retrieve the last messages of a user's conversation without reading the rest.
+
+    Args:
+        user_id (str): The user's Telegram ID
+        limit (int): Maximum number of messages to return
+
+    Returns:
+        list: Up to `limit` most recent message dictionaries in chronological
+        order, including 'firestore_doc_id'.
+
+    Raises:
+        Exception: Transient Firestore errors once retries are exhausted, so a
+        failed read is not mistaken for an empty history.
+    """
+    try:
+        current_db = get_db()
+        history_ref = (
+            current_db.collection("history").document(user_id).collection("messages")
+        )
+        # Read newest first so the query stops after `limit` documents
+        messages_query = history_ref.order_by(
+            "timestamp", direction=firestore.Query.DESCENDING
+        ).limit(limit)
+
+        history = []
+        for doc in messages_query.stream():
+            msg_data = doc.to_dict()
+            msg_data["firestore_doc_id"] = doc.id
+            history.append(msg_data)
+
+        history.reverse()
+        return history
+
+    except Exception as e:
+        if not isinstance(e, NON_RETRYABLE_EXCEPTIONS):
+            raise
+        logger.error("Error retrieving recent history for user %s: %s", user_id, e)
         return []
 
 
 @firestore.transactional
-def _add_message_transaction(transaction, user_id, message_data):
+def _add_message_transaction(transaction, current_db, user_id, messages_data):
     """
-    Transactional function to add a new message with a sequential ID.
+    Transactional function to add messages with sequential IDs.
     This function should not be called directly.
     """
-    current_db = get_db()
     # Path for the counter, e.g., history/123/_meta/counter
     counter_ref = (
         current_db.collection("history")
@@ -144,22 +231,40 @@ def _add_message_transaction(transaction, user_id, message_data):
     if counter_snapshot.exists:
         current_count = counter_snapshot.to_dict().get("count", 0)
 
-    new_message_id = current_count + 1
+    messages_ref = current_db.collection("history").document(user_id).collection("messages")
 
-    # The new message will have its ID as a string (e.g., "1", "2")
-    new_message_ref = (
-        current_db.collection("history")
-        .document(user_id)
-        .collection("messages")
-        .document(str(new_message_id))
-    )
+    # Each message gets the next ID as a string (e.g., "1", "2")
+    for offset, message_data in enumerate(messages_data, 1):
+        transaction.set(messages_ref.document(str(current_count + offset)), message_data)
 
-    transaction.set(new_message_ref, message_data)
-    transaction.set(counter_ref, {"count": new_message_id})
+    transaction.set(counter_ref, {"count": current_count + len(messages_data)})
     return True
 
 
+def add_messages_with_timestamp(user_id, messages, timestamp_obj):
+    """
+    Adds several messages for a user in one transaction, keeping sequential IDs.
 
+    Args:
+        user_id (str): The user's Telegram ID.
+        messages (list): (role, content) pairs in conversation order.
+        timestamp_obj (datetime): The timestamp for the messages.
+
+    Returns:
+        bool: Success status.
+    """
+    try:
+        current_db = get_db()
+        transaction = current_db.transaction()
+        messages_data = [
+            {"role": role, "content": content, "timestamp": timestamp_obj}
+            for role, content in messages
+        ]
+        _add_message_transaction(transaction, current_db, user_id, messages_data)
+        return True
+    except Exception as e:
+        logger.error("Error adding messages with sequential IDs for user %s: %s", user_id, e)
+        return False
 
 
 def add_message_with_timestamp(user_id, role, content, timestamp_obj):
@@ -175,21 +280,7 @@ def add_message_with_timestamp(user_id, role, content, timestamp_obj):
     Returns:
         bool: Success status.
     """
-    try:
-        current_db = get_db()
-        transaction = current_db.transaction()
-        message_data = {
-            "role": role,
-            "content": content,
-            "timestamp": timestamp_obj,
-        }
-        _add_message_transaction(transaction, user_id, message_data)
-        return True
-    except Exception as e:
-        logger.error(
-            f"Error adding message with sequential ID for user {user_id}: {str(e)}"
-        )
-        return False
+    return add_messages_with_timestamp(user_id, [(role, content)], timestamp_obj)
 
 
 @retry_sync()
@@ -228,7 +319,7 @@ def get_summaries(user_id):
         return summaries
 
     except Exception as e:
-        logger.error(f"Error retrieving summaries for user {user_id}: {str(e)}")
+        logger.error("Error retrieving summaries for user %s: %s", user_id, e)
         return []
 
 
@@ -253,14 +344,30 @@ def add_summary(user_id, summary_content):
         )
         summaries_ref.add({"content": summary_content, "timestamp": timestamp})
 
-        logger.debug(f"Added summary for user {user_id}")
+        logger.debug("Added summary for user %s", user_id)
         return True
 
     except Exception as e:
-        logger.error(f"Error adding summary for user {user_id}: {str(e)}")
+        logger.error("Error adding summary for user %s: %s", user_id, e)
         return False
 
 
+def _cache_get(cache, user_id):
+    """Return a live cached value for the user, or _MISSING"""
+    entry = cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return _MISSING
+
+
+def _cache_put(cache, user_id, value, ttl):
+    """Store a value in an in-process cache, evicting the oldest entry when full"""
+    cache.pop(user_id, None)
+    if len(cache) >= USER_CACHE_MAX_SIZE:
+        cache.pop(next(iter(cache)), None)
+    cache[user_id] = (time.monotonic() + ttl, value)
+
+
 @retry_sync()
 def get_system_prompt(user_id):
     """
@@ -272,17 +379,21 @@ def get_system_prompt(user_id):
     Returns:
         str or None: The system prompt if found, None otherwise
     """
+    cached = _cache_get(_system_prompt_cache, user_id)
+    if cached is not _MISSING:
+        return cached
+
     try:
         current_db = get_db()
         prompt_ref = current_db.collection("system_prompts").document(user_id)
         prompt_doc = prompt_ref.get()
 
-        if prompt_doc.exists:
-            return prompt_doc.to_dict().get("prompt")
-        return None
+        prompt = prompt_doc.to_dict().get("prompt") if prompt_doc.exists else None
+        _cache_put(_system_prompt_cache, user_id, prompt, Config.SYSTEM_PROMPT_CACHE_TTL)
+        return prompt
 
     except Exception as e:
-        logger.error(f"Error retrieving system prompt for user {user_id}: {str(e)}")
+        logger.error("Error retrieving system prompt for user %s: %s", user_id, e)
         return None
 
 
@@ -302,12 +413,13 @@ def set_system_prompt(user_id, prompt):
         current_db = get_db()
         prompt_ref = current_db.collection("system_prompts").document(user_id)
         prompt_ref.set({"prompt": prompt, "updated_at": datetime.utcnow()})
+        _cache_put(_system_prompt_cache, user_id, prompt, Config.SYSTEM_PROMPT_CACHE_TTL)
 
-        logger.debug(f"Set system prompt for user {user_id}")
+        logger.debug("Set system prompt for user %s", user_id)
         return True
 
     except Exception as e:
-        logger.error(f"Error setting system prompt for user {user_id}: {str(e)}")
+        logger.error("Error setting system prompt for user %s: %s", user_id, e)
         return False
 
 
@@ -320,19 +432,24 @@ def get_user_settings(user_id):
         user_id (str): The user's Telegram ID
 
     Returns:
-        dict or None: User settings if found, None otherwise
+        dict or None: User settings if found, None otherwise. The dict may be
+        shared with the cache, so callers must not mutate it.
     """
+    cached = _cache_get(_user_settings_cache, user_id)
+    if cached is not _MISSING:
+        return cached
+
     try:
         current_db = get_db()
         settings_ref = current_db.collection("user_settings").document(user_id)
         settings_doc = settings_ref.get()
 
-        if settings_doc.exists:
-            return settings_doc.to_dict()
-        return None
+        settings = settings_doc.to_dict() if settings_doc.exists else None
+        _cache_put(_user_settings_cache, user_id, settings, Config.USER_SETTINGS_CACHE_TTL)
+        return settings
 
     except Exception as e:
-        logger.error(f"Error retrieving user settings for user {user_id}: {str(e)}")
+        logger.error("Error retrieving user settings for user %s: %s", user_id, e)
         return None
 
 
@@ -358,12 +475,15 @@ def set_user_settings(user_id, settings):
         updated_settings["updated_at"] = datetime.utcnow()
 
         settings_ref.set(updated_settings)
+        _cache_put(
+            _user_settings_cache, user_id, updated_settings, Config.USER_SETTINGS_CACHE_TTL
+        )
 
-        logger.debug(f"Set user settings for user {user_id}: {settings}")
+        logger.debug("Set user settings for user %s: %s", user_id, settings)
         return True
 
     except Exception as e:
-        logger.error(f"Error setting user settings for user {user_id}: {str(e)}")
+        logger.error("Error setting user settings for user %s: %s", user_id, e)
         return False
 
 
@@ -402,9 +522,7 @@ def get_last_user_message_timestamp(user_id):
         return None  # No user messages found
 
     except Exception as e:
-        logger.error(
-            f"Error getting last user message timestamp for user {user_id}: {str(e)}"
-        )
+        logger.error("Error getting last user message timestamp for user %s: %s", user_id, e)
         return None
 
 
@@ -450,7 +568,7 @@ def generate_timestamp_info(user_id):
         return time_info
 
     except Exception as e:
-        logger.error(f"Error generating timestamp info for user {user_id}: {str(e)}")
+        logger.error("Error generating timestamp info for user %s: %s", user_id, e)
         return "Текущее время: ошибка получения времени"
 
 
@@ -458,12 +576,11 @@ def generate_timestamp_info(user_id):
 
 
 @firestore.transactional
-def _add_fact_transaction(transaction, user_id, fact_data):
+def _add_fact_transaction(transaction, current_db, user_id, fact_data):
     """
     Transactional function to add a new fact with a sequential ID.
     This function should not be called directly. Use `add_fact`.
     """
-    current_db = get_db()
     counter_ref = (
         current_db.collection("factology")
         .document(user_id)
@@ -514,12 +631,12 @@ def add_fact(
             "timestamp": timestamp,
             "hot": hot,
         }
-        _add_fact_transaction(transaction, user_id, fact_data)
-        logger.debug(f"Added fact for user {user_id}")
+        _add_fact_transaction(transaction, current_db, user_id, fact_data)
+        logger.debug("Added fact for user %s", user_id)
         return True
 
     except Exception as e:
-        logger.error(f"Error adding fact for user {user_id}: {str(e)}")
+        logger.error("Error adding fact for user %s: %s", user_id, e)
         return False
 
 
@@ -555,7 +672,7 @@ def get_facts(user_id: str, limit: int = None) -> List[Dict[str, Any]]:
         return facts
 
     except Exception as e:
-        logger.error(f"Error getting facts for user {user_id}: {str(e)}")
+        logger.error("Error getting facts for user %s: %s", user_id, e)
         return []
 
 
@@ -586,10 +703,10 @@ def update_fact(user_id: str, fact_id: str, new_content: str):
                 "timestamp": datetime.now(timezone.utc).isoformat(),
             }
         )
-        logger.info(f"Updated fact {fact_id} for user {user_id}")
+        logger.info("Updated fact %s for user %s", fact_id, user_id)
         return True
     except Exception as e:
-        logger.error(f"Error updating fact {fact_id} for user {user_id}: {e}")
+        logger.error("Error updating fact %s for user %s: %s", fact_id, user_id, e)
         return False
 
 
@@ -614,10 +731,10 @@ def delete_fact(user_id: str, fact_id: str):
             .document(fact_id)
         )
         fact_ref.delete()
-        logger.info(f"Deleted fact {fact_id} for user {user_id}")
+        logger.info("Deleted fact %s for user %s", fact_id, user_id)
         return True
     except Exception as e:
-        logger.error(f"Error deleting fact {fact_id} for user {user_id}: {e}")
+        logger.error("Error deleting fact %s for user %s: %s", fact_id, user_id, e)
         return False
 
 
@@ -654,7 +771,7 @@ def get_facts_by_ids(user_id: str, fact_ids: List[str]) -> List[Dict[str, Any]]:
 
         return facts
     except Exception as e:
-        logger.error(f"Error getting facts by IDs for user {user_id}: {e}")
+        logger.error("Error getting facts by IDs for user %s: %s", user_id, e)
         return []
 
 
@@ -679,7 +796,7 @@ def update_fact_fields(user_id: str, fact_id: str, updates: Dict[str, Any]):
         fact_ref.update(updates)
         return True
     except Exception as e:
-        logger.error(f"Error updating fact {fact_id} for user {user_id}: {e}")
+        logger.error("Error updating fact %s for user %s: %s", fact_id, user_id, e)
         return False
 
 
@@ -707,70 +824,42 @@ def delete_facts_by_ids(user_id: str, fact_ids: List[str]):
             batch.delete(fact_ref)
 
         batch.commit()
-        logger.info(f"Successfully deleted {len(fact_ids)} facts for user {user_id}.")
+        logger.info("Successfully deleted %d facts for user %s.", len(fact_ids), user_id)
         return len(fact_ids)
     except Exception as e:
-        logger.error(
-            f"Error deleting facts by batch for user {user_id}: {str(e)}",
-            exc_info=True,
-        )
+        logger.error("Error deleting facts by batch for user %s: %s", user_id, e, exc_info=True)
         return 0
 
 
-@retry_sync()
-def has_processed_update(update_id):
+def try_claim_update(update_id):
     """
-    Check if a Telegram update has already been processed.
+    Atomically mark a Telegram update as processed, if no one has yet.
+
+    A single create() is one round-trip, and two instances can't both claim
+    the same update.
 
     Args:
         update_id (int): Telegram update ID
 
     Returns:
-        bool: True if already processed, False otherwise
+        bool: True if this caller claimed the update and should handle it
     """
     try:
         current_db = get_db()
-        collection_name = Config.IDEMPOTENCY_COLLECTION
-        processed_ref = current_db.collection(collection_name).document(
+        processed_ref = current_db.collection(Config.IDEMPOTENCY_COLLECTION).document(
             str(update_id)
         )
-        doc = processed_ref.get()
+        processed_ref.create({"processed_at": datetime.utcnow(), "update_id": update_id})
+        return True
 
-        return doc.exists
+    except AlreadyExists:
+        return False
 
     except Exception as e:
-        logger.error(f"Error checking processed update {update_id}: {str(e)}")
+        logger.error("Error claiming update %s: %s", update_id, e)
         # In case of error, assume not processed to avoid losing messages
-        return False
-
-
-@retry_sync()
-def mark_update_processed(update_id):
-    """
-    Mark a Telegram update_id as processed to prevent duplicate handling.
-
-    Args:
-        update_id (int): Telegram update ID
-
-    Returns:
-        bool: Success status
-    """
-    try:
-        current_db = get_db()
-        collection_name = Config.IDEMPOTENCY_COLLECTION
-        processed_ref = current_db.collection(collection_name).document(
-            str(update_id)
-        )
-
-        processed_ref.set({"processed_at": datetime.utcnow(), "update_id": update_id})
-
-        logger.debug(f"Marked update {update_id} as processed")
         return True
 
-    except Exception as e:
-        logger.error(f"Error marking update {update_id} as processed: {str(e)}")
-        return False
-
 
 @retry_async()
 async def get_fact_by_id(user_id: str, fact_id: str):
@@ -785,10 +874,10 @@ async def get_fact_by_id(user_id: str, fact_id: str):
             .collection("facts")
             .document(fact_id)
         )
-        fact_doc = await fact_ref.get()
+        fact_doc = await asyncio.to_thread(fact_ref.get)
         return fact_doc.to_dict() if fact_doc.exists else None
     except Exception as e:
-        logger.error(f"Error fetching fact {fact_id} for user {user_id}: {e}")
+        logger.error("Error fetching fact %s for user %s: %s", fact_id, user_id, e)
         return None
 
 
@@ -808,7 +897,7 @@ async def get_all_facts(user_id: str) -> List[dict]:
         facts_ref = (
             current_db.collection("factology").document(user_id).collection("entries")
         )
-        docs = facts_ref.stream()
+        docs = await asyncio.to_thread(lambda: list(facts_ref.stream()))
 
         facts = []
         for doc in docs:
@@ -817,7 +906,7 @@ async def get_all_facts(user_id: str) -> List[dict]:
             facts.append(fact_data)
         return facts
     except Exception as e:
-        logger.error(f"Error getting all facts for user {user_id}: {e}")
+        logger.error("Error getting all facts for user %s: %s", user_id, e)
         return []
 
 
@@ -833,11 +922,8 @@ async def get_facts_async(user_id: str, limit: int = None) -> List[Dict[str, Any
     Returns:
         List of fact dictionaries
     """
-    import asyncio
-    
-    # Run the sync function in a thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: get_facts(user_id, limit))
+    # Run the sync function in a worker thread to avoid blocking the event loop
+    return await asyncio.to_thread(get_facts, user_id, limit)
 
 
 @retry_async()
@@ -851,8 +937,23 @@ async def get_history_async(user_id: str):
     Returns:
         List of message dictionaries
     """
-    import asyncio
-    
-    # Run the sync function in a thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, lambda: get_history(user_id))
+    # Run the sync function in a worker thread to avoid blocking the event loop
+    return await asyncio.to_thread(get_history, user_id)
+
+
+async def get_recent_history_async(user_id: str, limit: int):
+    """
+    Async version of get_recent_history to prevent blocking the event loop.
+
+    Not wrapped in retry_async: get_recent_history already retries, and a
+    second layer would multiply the attempts.
+
+    Args:
+        user_id: The user ID to fetch history for
+        limit: Maximum number of messages to return
+
+    Returns:
+        List of message dictionaries
+    """
+    # Run the sync function in a worker thread to avoid blocking the event loop
+    return await asyncio.to_thread(get_recent_history, user_id, limit)
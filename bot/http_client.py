@@ -0,0 +1,41 @@
+"""
+Shared HTTP client.
+
+A single pooled httpx.AsyncClient is used for the bot's outbound HTTP traffic
+(OpenAI, the keep-alive worker, ...) so all callers share connections, TLS
+sessions and DNS lookups instead of each keeping a pool of its own.
+"""
+
+import logging
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Shared client will be initialized lazily
+_http_client = None
+
+
+def get_http_client():
+    """Get the shared async HTTP client, creating it if needed"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(240.0),  # 4 minutes, long enough for o3 requests
+            limits=httpx.Limits(
+                max_connections=40,
+                max_keepalive_connections=20,
+                keepalive_expiry=600.0  # 10 minutes - longer connection lifetime
+            ),
+            http2=True  # Enable HTTP/2 for better performance
+        )
+        logger.info("Shared HTTP client created")
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared async HTTP client if it was created"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+        logger.info("Shared HTTP client closed")
@@ -8,19 +8,23 @@ from fastapi import FastAPI, Request, BackgroundTasks, HTTPException
 from fastapi.responses import JSONResponse
 from telegram.ext import Application
 from telegram import Update
-from bot.telegram_router import setup_handlers, handle_update
+from bot.telegram_router import setup_handlers, handle_update, drain_history_writes
 from bot.error_middleware import add_error_middleware, setup_error_handler
 from config import Config
-from bot.firestore_client import get_db
+from bot.firestore_client import init_db_pool, get_health_db
+from bot.http_client import get_http_client, close_http_client
+from bot.speech_to_text import close_client as close_stt_client
 from google.auth.exceptions import DefaultCredentialsError, TransportError
-import httpx
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 # Global variables for health checking
 last_health_check = 0
-health_check_interval = 300  # 5 minutes
+HEALTH_CHECK_BASE_INTERVAL = 300  # 5 minutes
+HEALTH_CHECK_MIN_INTERVAL = 15  # re-check quickly after a failure
+HEALTH_CHECK_MAX_INTERVAL = 900  # back off to 15 minutes while healthy
+health_check_interval = HEALTH_CHECK_BASE_INTERVAL
 firebase_healthy = False
 
 # Keep-alive task
@@ -28,18 +32,19 @@ keep_alive_task = None
 
 def check_firebase_health():
     """Check if Firebase is healthy and update global state"""
-    global firebase_healthy, last_health_check
+    global firebase_healthy, last_health_check, health_check_interval
     
     current_time = time.time()
     if current_time - last_health_check < health_check_interval:
         return firebase_healthy
     
+    was_healthy = firebase_healthy
     try:
         logger.info("Checking Firebase connectivity...")
-        db = get_db()
-        # Simple test operation
-        test_doc = db.collection('_health_check').document('test')
-        test_doc.set({'timestamp': time.time(), 'status': 'healthy'}, merge=True)
+        # Probe on the reserved client so health checks don't take request capacity
+        db = get_health_db()
+        # Read-only probe: cheaper than a write and no single hot document
+        db.collection('_health_check').document('test').get()
         firebase_healthy = True
         logger.info("Firebase health check passed")
     except (DefaultCredentialsError, TransportError) as e:
@@ -49,6 +54,14 @@ def check_firebase_health():
         logger.error(f"Firebase health check failed: {e}")
         firebase_healthy = False
     
+    # Check less often while healthy; after a failure re-check soon and back off
+    if firebase_healthy:
+        health_check_interval = min(health_check_interval * 2, HEALTH_CHECK_MAX_INTERVAL)
+    elif was_healthy or last_health_check == 0:
+        health_check_interval = HEALTH_CHECK_MIN_INTERVAL
+    else:
+        health_check_interval = min(health_check_interval * 2, HEALTH_CHECK_BASE_INTERVAL)
+    
     last_health_check = current_time
     return firebase_healthy
 
@@ -102,9 +115,18 @@ async def lifespan(app: FastAPI):
     # Initialize the bot on startup
     logger.info("Starting up application...")
     
+    # Build the Firestore client pool once, before serving traffic
+    try:
+        init_db_pool()
+    except Exception as e:
+        logger.error(f"Failed to initialize Firestore client pool: {e}")
+    
     # Check Firebase health on startup
     check_firebase_health()
     
+    # Shared HTTP connection pool for OpenAI and the keep-alive worker
+    app.state.http = get_http_client()
+    
     # Warm up OpenAI connection
     from bot.openai_client import warmup_openai_connection
     await warmup_openai_connection()
@@ -114,7 +136,7 @@ async def lifespan(app: FastAPI):
     
     # Start keep-alive task in production
     if os.getenv("RUN_MODE") != "local":
-        keep_alive_task = asyncio.create_task(keep_alive_worker())
+        keep_alive_task = asyncio.create_task(keep_alive_worker(app.state.http))
         logger.info("Keep-alive task started")
     
     logger.info("Application startup completed")
@@ -132,9 +154,16 @@ async def lifespan(app: FastAPI):
         except asyncio.CancelledError:
             logger.info("Keep-alive task cancelled")
     
+    # Let background history writes finish before the process goes away
+    await drain_history_writes()
+
     # Shutdown the bot
     if app.state.telegram_bot:
         await app.state.telegram_bot.shutdown()
+    
+    # Close the shared HTTP connection pools
+    await close_http_client()
+    await close_stt_client()
     logger.info("Application shutdown completed")
 
 def build_app():
@@ -212,8 +241,8 @@ def build_app():
 # Create the app instance
 app = build_app()
 
-async def keep_alive_worker():
-    """Keep the container warm to avoid cold starts"""
+async def keep_alive_worker(client):
+    """Keep the container warm to avoid cold starts, using the shared HTTP client"""
     if os.getenv("RUN_MODE") == "local":
         logger.info("Keep-alive disabled in local mode")
         return
@@ -226,28 +255,27 @@ async def keep_alive_worker():
     
     logger.info(f"Starting keep-alive worker for {health_url}")
     
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        ping_counter = 0
-        while True:
-            try:
-                # Wait 20 minutes between keep-alive cycles (reduced from 8 min)
-                await asyncio.sleep(1200)  # 20 minutes
-                ping_counter += 1
-                
-                # Health check every cycle
-                response = await client.get(health_url)
-                if response.status_code == 200:
-                    logger.debug(f"Keep-alive health check successful (cycle {ping_counter})")
-                else:
-                    logger.warning(f"Keep-alive health check returned: {response.status_code}")
+    ping_counter = 0
+    while True:
+        try:
+            # Wait 20 minutes between keep-alive cycles (reduced from 8 min)
+            await asyncio.sleep(1200)  # 20 minutes
+            ping_counter += 1
+            
+            # Health check every cycle
+            response = await client.get(health_url, timeout=30.0)
+            if response.status_code == 200:
+                logger.debug(f"Keep-alive health check successful (cycle {ping_counter})")
+            else:
+                logger.warning(f"Keep-alive health check returned: {response.status_code}")
+            
+            # Note: OpenAI ping removed to save API costs
+            # OpenAI connections will warm up on first actual request
                 
-                # Note: OpenAI ping removed to save API costs
-                # OpenAI connections will warm up on first actual request
-                    
-            except Exception as e:
-                logger.error(f"Keep-alive worker failed: {e}")
-                # Continue trying even if one fails
-                continue
+        except Exception as e:
+            logger.error(f"Keep-alive worker failed: {e}")
+            # Continue trying even if one fails
+            continue
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,11 +1,13 @@
 import logging
-from typing import List, Dict, Any, Tuple
+from types import SimpleNamespace
+from typing import List, Dict, Any, Tuple, Callable, Awaitable, Optional
 from openai import OpenAI, AsyncOpenAI
+from pydantic import ValidationError
 from config import Config
 from bot.retry_utils import retry_async
-from bot.prompt_builder import FactSummaryResult
-import json
-from bot.schemas import tools_schema as o3_tools_schema
+from bot.prompt_builder import FactSummaryResult, o4_mini_tools_schema, o4_mini_tool_choice
+from bot.schemas import tools_schema as o3_tools_schema, tool_choice as o3_tool_choice
+from bot.http_client import get_http_client
 import httpx
 import time
 import base64
@@ -15,6 +17,25 @@ logger = logging.getLogger(__name__)
 # OpenAI client will be initialized lazily
 _client = None
 _async_client = None
+# The shared HTTP client _async_client was built on
+_async_http_client = None
+
+# Messages mentioning any of these always get full reasoning effort
+CRISIS_KEYWORDS = (
+    "суицид",
+    "покончить с собой",
+    "убить себя",
+    "не хочу жить",
+    "не хочется жить",
+    "умереть",
+    "самоповрежд",
+    "порезать себя",
+    "suicid",
+    "kill myself",
+    "end my life",
+    "self-harm",
+    "self harm",
+)
 
 
 def get_client():
@@ -42,52 +63,146 @@ def get_client():
 
 def get_async_client():
     """Get Async OpenAI client, creating it if needed"""
-    global _async_client
-    if _async_client is None:
-        # Create custom async httpx client with connection pooling and timeouts
-        http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(240.0),  # 4 minutes total timeout
-            limits=httpx.Limits(
-                max_connections=20,
-                max_keepalive_connections=15,  # Increased for better connection reuse
-                keepalive_expiry=600.0  # 10 minutes - longer connection lifetime
-            ),
-            http2=True  # Enable HTTP/2 for better performance
-        )
-        
+    global _async_client, _async_http_client
+    # Reuse the application's shared connection pool; if that pool was closed and
+    # replaced (e.g. on shutdown), rebuild so we never send on a closed client
+    http_client = get_http_client()
+    if _async_client is None or _async_http_client is not http_client:
         _async_client = AsyncOpenAI(
             api_key=Config.OPENAI_API_KEY,
             timeout=240.0,  # 4 minutes timeout (increased from 2)
             http_client=http_client
         )
+        _async_http_client = http_client
     return _async_client
 
 
+def build_image_data_uri(image_data: bytes, mime_type: str = "image/jpeg") -> str:
+    """
+    Builds a base64 `data:` URI for an image.
+
+    The URI is assembled as bytes and decoded once at the end, so the large
+    base64 payload is not copied into intermediate strings. Accepts any
+    bytes-like object, so downloaded bytearrays don't need a `bytes()` copy.
+    """
+    prefix = b"data:" + mime_type.encode("ascii") + b";base64,"
+    return (prefix + base64.b64encode(image_data)).decode("ascii")
+
+
+def select_reasoning_effort(messages: List[Dict[str, Any]], image_data: bytes = None) -> str:
+    """
+    Picks the o3 reasoning effort from the shape of the latest user message.
+
+    Short conversational turns ("hi", "ok", an emoji) get "low"; long messages,
+    images and anything mentioning a crisis keep "high".
+
+    Args:
+        messages: The message payload for the o3 call.
+        image_data: Optional image bytes sent along with the message.
+
+    Returns:
+        "low" or "high".
+    """
+    if image_data:
+        return "high"
+
+    user_text = next(
+        (m["content"] for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    if not isinstance(user_text, str) or len(user_text) > Config.LOW_EFFORT_MAX_CHARS:
+        return "high"
+
+    lowered = user_text.lower()
+    if any(keyword in lowered for keyword in CRISIS_KEYWORDS):
+        return "high"
+
+    return "low"
+
+
+async def _collect_stream(
+    stream, on_delta: Optional[Callable[[str], Awaitable[None]]] = None
+):
+    """
+    Accumulates a streamed chat completion into a single message object.
+
+    Args:
+        stream: The async stream returned by `chat.completions.create(stream=True)`.
+        on_delta: Optional coroutine called with the tool call arguments received so far.
+
+    Returns:
+        A message object exposing `content` and `tool_calls` like a non-streamed one.
+    """
+    content_parts = []
+    tool_calls = {}
+
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        if delta.content:
+            content_parts.append(delta.content)
+
+        for tool_call_delta in delta.tool_calls or []:
+            call = tool_calls.setdefault(
+                tool_call_delta.index, {"id": None, "name": "", "arguments": ""}
+            )
+            if tool_call_delta.id:
+                call["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                call["name"] += tool_call_delta.function.name or ""
+                call["arguments"] += tool_call_delta.function.arguments or ""
+
+        if on_delta and delta.tool_calls and 0 in tool_calls:
+            await on_delta(tool_calls[0]["arguments"])
+
+    return SimpleNamespace(
+        role="assistant",
+        content="".join(content_parts) or None,
+        tool_calls=[
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"]),
+            )
+            for _, call in sorted(tool_calls.items())
+        ]
+        or None,
+    )
+
+
 @retry_async()
-async def get_o3_response_tool(messages: List[Dict[str, Any]], image_data: bytes = None):
+async def get_o3_response_tool(
+    messages: List[Dict[str, Any]],
+    image_data: bytes = None,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+):
     """
     Gets a response from the o3 model, forcing it to use the 'process_user_message' tool.
     Supports both text-only and image+text inputs.
 
-    This function makes a single API call and returns the resulting message,
-    which is expected to contain a tool_call with the analysis.
+    The response is streamed so callers can show the reply while it is being
+    generated; the chunks are accumulated into a single message before returning.
 
     Args:
         messages: A list of message dictionaries for the conversation history.
         image_data: Optional image bytes to include with the last user message.
+        on_delta: Optional coroutine called with the tool call arguments received so far.
 
     Returns:
-        The message object from the OpenAI API response.
+        The message object assembled from the streamed OpenAI API response.
     """
+    reasoning_effort = select_reasoning_effort(messages, image_data)
     logger.debug(
-        f"Sending request to o3 with {len(messages)} messages, forcing tool call."
+        "Sending request to o3 with %d messages, forcing tool call (reasoning effort: %s).",
+        len(messages),
+        reasoning_effort,
     )
     
     # If image_data is provided, modify the last user message to include the image
     if image_data:
         logger.debug("Adding image to the last user message")
-        b64 = base64.b64encode(image_data).decode()
-        data_uri = f"data:image/jpeg;base64,{b64}"
+        data_uri = build_image_data_uri(image_data)
         
         # Find the last user message and convert it to multimodal format
         for i in reversed(range(len(messages))):
@@ -102,23 +217,22 @@ async def get_o3_response_tool(messages: List[Dict[str, Any]], image_data: bytes
     aclient = get_async_client()
 
     try:
-        response = await aclient.chat.completions.create(
+        stream = await aclient.chat.completions.create(
             model=Config.OPENAI_MODEL,  # Should be "o3"
             messages=messages,
             tools=o3_tools_schema,
-            tool_choice={
-                "type": "function",
-                "function": {"name": "process_user_message"},
-            },
-            extra_body={"reasoning_effort": "high"},
+            tool_choice=o3_tool_choice,
+            extra_body={"reasoning_effort": reasoning_effort},
+            stream=True,
             # No max_completion_tokens needed as response is in tool
         )
-        message = response.choices[0].message
-        logger.debug(f"Raw o3 response message: {message}")
+        message = await _collect_stream(stream, on_delta)
+        # Lazy args: the message repr holds the whole reply and is only built at DEBUG
+        logger.debug("Raw o3 response message: %s", message)
         return message
 
     except Exception as e:
-        logger.error(f"Error calling o3 API with tool forcing: {e}", exc_info=True)
+        logger.error("Error calling o3 API with tool forcing: %s", e, exc_info=True)
         # Re-raise the exception to be handled by the caller
         raise
 
@@ -143,72 +257,67 @@ async def get_o4_mini_summary(
     overall_start = time.time()
     
     logger.info("Requesting summary from o4-mini.")
-    logger.info(f"[OPENAI-TIMING] Starting o4-mini request at {time.time()}")
+    logger.info("[OPENAI-TIMING] Starting o4-mini request at %s", time.time())
     
     aclient = get_async_client()
 
-    # o4-mini requires a specific tool schema, which is defined in prompt_builder
-    from bot.prompt_builder import o4_mini_tools_schema
-
     try:
         api_start = time.time()
-        logger.info(f"[OPENAI-TIMING] About to call OpenAI API...")
+        logger.info("[OPENAI-TIMING] About to call OpenAI API...")
         
         response = await aclient.chat.completions.create(
             model="o4-mini",
             messages=messages,
             tools=o4_mini_tools_schema,
-            tool_choice={
-                "type": "function",
-                "function": {"name": "process_context_for_summary"},
-            },
+            tool_choice=o4_mini_tool_choice,
             extra_body={"reasoning_effort": "high"},
         )
         
         api_end = time.time()
-        logger.info(f"[OPENAI-TIMING] OpenAI API call completed in {api_end - api_start:.2f}s")
+        logger.info("[OPENAI-TIMING] OpenAI API call completed in %.2fs", api_end - api_start)
 
         raw_response_content = response.choices[0].message.tool_calls[0].function.arguments
-        logger.debug(f"Raw o4-mini response: {raw_response_content}")
+        logger.debug("Raw o4-mini response: %s", raw_response_content)
 
         try:
             parse_start = time.time()
-            # First, parse the string into a Python dictionary
-            response_data = json.loads(raw_response_content)
-            # Then, validate the dictionary against the Pydantic model
-            validated_result = FactSummaryResult.model_validate(response_data)
+            # Parse and validate in a single pass inside pydantic-core
+            validated_result = FactSummaryResult.model_validate_json(raw_response_content)
             parse_end = time.time()
             
             logger.info("o4-mini response validated successfully.")
-            logger.info(f"[OPENAI-TIMING] Parsing took {parse_end - parse_start:.2f}s")
-            logger.info(f"[OPENAI-TIMING] Total o4-mini operation took {time.time() - overall_start:.2f}s")
+            logger.info("[OPENAI-TIMING] Parsing took %.2fs", parse_end - parse_start)
+            logger.info(
+                "[OPENAI-TIMING] Total o4-mini operation took %.2fs", time.time() - overall_start
+            )
             
             return validated_result, raw_response_content
             
-        except json.JSONDecodeError:
-            logger.error(
-                f"Failed to decode JSON from o4-mini response: {raw_response_content}"
-            )
-            raise ValueError("Invalid JSON response from model.")
-        except Exception as e:
-            logger.error(f"Pydantic validation failed for o4-mini response: {e}")
+        except ValidationError as e:
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                logger.error(
+                    "Failed to decode JSON from o4-mini response: %s",
+                    raw_response_content,
+                )
+                raise ValueError("Invalid JSON response from model.")
+            logger.error("Pydantic validation failed for o4-mini response: %s", e)
             raise ValueError(f"Model response does not match expected schema: {e}")
             
     except Exception as e:
         api_failed_time = time.time()
 
         logger.error(
-            f"[OPENAI-TIMING] OpenAI API failed after {api_failed_time - overall_start:.2f}s"
+            "[OPENAI-TIMING] OpenAI API failed after %.2fs",
+            api_failed_time - overall_start,
         )
-        logger.error(f"OpenAI API error: {e}", exc_info=True)
+        logger.error("OpenAI API error: %s", e, exc_info=True)
         raise
 
 
 @retry_async()
 async def ask_o3_with_image(img_bytes: bytes, user_text: str, mime_type: str = "image/jpeg") -> str:
     """Send an image and optional text to the o3 model and return the reply."""
-    b64 = base64.b64encode(img_bytes).decode()
-    data_uri = f"data:{mime_type};base64,{b64}"
+    data_uri = build_image_data_uri(img_bytes, mime_type)
     messages = [
         {
             "role": "user",
@@ -232,26 +341,24 @@ async def warmup_openai_connection():
     """
     Warm up OpenAI connection during startup to establish SSL handshake and connection pooling.
     This helps avoid slow first requests when CPU is throttled.
+
+    Uses a model metadata lookup, which is not billed, instead of a completion.
     """
     try:
         logger.info("🔥 Warming up OpenAI connection...")
         aclient = get_async_client()
         
-        # Make a minimal request to establish connection
+        # Make a minimal non-billable request to establish connection
         start_time = time.time()
-        response = await aclient.chat.completions.create(
-            model="gpt-3.5-turbo",  # Cheap model for warmup
-            messages=[{"role": "user", "content": "warmup"}],
-            max_tokens=1  # Minimal response
-        )
+        await aclient.models.retrieve(Config.OPENAI_MODEL)
         
         warmup_time = time.time() - start_time
-        logger.info(f"✅ OpenAI connection warmed up successfully in {warmup_time:.2f}s")
+        logger.info("✅ OpenAI connection warmed up successfully in %.2fs", warmup_time)
         
         return True
         
     except Exception as e:
-        logger.warning(f"⚠️ OpenAI warmup failed: {e}")
+        logger.warning("⚠️ OpenAI warmup failed: %s", e)
         return False
 
 
@@ -259,23 +366,21 @@ async def ping_openai_connection():
     """
     Send a lightweight ping to OpenAI to keep connection alive.
     Used by keep-alive worker to maintain warm connections.
+
+    Uses a model metadata lookup, which is not billed, instead of a completion.
     """
     try:
         logger.debug("🏓 Pinging OpenAI connection...")
         aclient = get_async_client()
         
         start_time = time.time()
-        response = await aclient.chat.completions.create(
-            model="gpt-3.5-turbo",  # Cheap model for ping
-            messages=[{"role": "user", "content": "ping"}],
-            max_tokens=1  # Minimal response
-        )
+        await aclient.models.retrieve(Config.OPENAI_MODEL)
         
         ping_time = time.time() - start_time
-        logger.debug(f"✅ OpenAI ping successful in {ping_time:.2f}s")
+        logger.debug("✅ OpenAI ping successful in %.2fs", ping_time)
         
         return True
         
     except Exception as e:
-        logger.warning(f"⚠️ OpenAI ping failed: {e}")
+        logger.warning("⚠️ OpenAI ping failed: %s", e)
         return False
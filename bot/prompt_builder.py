@@ -8,18 +8,12 @@ pre-processing model and the main o3 therapist model.
 import logging
 from typing import List, Dict, Optional, Any
 from pydantic import BaseModel, Field, field_validator, ConfigDict
-import uuid
+import itertools
 import json
+import os
 import datetime
 from pathlib import Path
 
-# Internal imports for payload generation
-from bot.firestore_client import (
-    get_system_prompt,
-    set_system_prompt,
-)
-from config import DEFAULT_SYSTEM_PROMPT
-
 logger = logging.getLogger(__name__)
 
 # --- Pydantic Schemas for o4-mini response validation ---
@@ -86,10 +80,28 @@ o4_mini_tools_schema = [
     }
 ]
 
+o4_mini_tool_choice = {
+    "type": "function",
+    "function": {"name": "process_context_for_summary"},
+}
+
 # --- File path for the o4-mini prompt ---
 PROMPT_DIR = Path(__file__).resolve().parent / "prompts"
 O4_MINI_PROMPT_PATH = PROMPT_DIR / "o4_mini_system_prompt.txt"
 
+# Separators for compact JSON in model payloads
+COMPACT_JSON_SEPARATORS = (",", ":")
+
+# Pseudo tool call IDs only need to be unique within a payload, so a process-wide
+# counter is enough (uuid4 reads os.urandom for every ID)
+_PID_HEX = f"{os.getpid():x}"
+_tool_call_counter = itertools.count()
+
+
+def make_tool_call_id(name: str) -> str:
+    """Returns a unique ID for a pseudo tool call."""
+    return f"call_{_PID_HEX}{next(_tool_call_counter):x}_{name}"
+
 
 def json_serializer(obj):
     """Custom JSON serializer for objects not serializable by default json code"""
@@ -103,8 +115,7 @@ def json_serializer(obj):
 def load_o4_mini_prompt() -> str:
     """Loads the o4-mini system prompt from its file."""
     try:
-        with open(O4_MINI_PROMPT_PATH, "r", encoding="utf-8") as f:
-            return f.read()
+        return O4_MINI_PROMPT_PATH.read_text(encoding="utf-8")
     except FileNotFoundError:
         logger.error(
             f"o4-mini system prompt not found at {O4_MINI_PROMPT_PATH}. Using a basic fallback."
@@ -112,6 +123,10 @@ def load_o4_mini_prompt() -> str:
         return "You are a helpful assistant. Analyze the facts and the user message to provide a summary."
 
 
+# Load the prompt into a constant so it's read from disk only once on module import
+O4_MINI_SYSTEM_PROMPT = load_o4_mini_prompt()
+
+
 # --- Payload Builder for o4-mini ---
 
 
@@ -122,12 +137,11 @@ def build_o4_mini_payload(
     messages = []
 
     # 1. System Prompt
-    system_prompt = load_o4_mini_prompt()
-    messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "system", "content": O4_MINI_SYSTEM_PROMPT})
 
     # Helper to create pseudo tool calls
     def create_pseudo_tool_call(name: str, content: str):
-        tool_call_id = f"call_{uuid.uuid4().hex[:10]}_{name}"  # Shortened UUID
+        tool_call_id = make_tool_call_id(name)
         return [
             {
                 "role": "assistant",
@@ -147,12 +161,16 @@ def build_o4_mini_payload(
             },
         ]
 
-    # 2. Factology
-    factology_content = json.dumps(facts, ensure_ascii=False, indent=2, default=json_serializer)
+    # 2. Factology (compact JSON: the model doesn't need indentation, and it costs tokens)
+    factology_content = json.dumps(
+        facts, ensure_ascii=False, separators=COMPACT_JSON_SEPARATORS, default=json_serializer
+    )
     messages.extend(create_pseudo_tool_call("get_factology", factology_content))
 
     # 3. Recent History
-    history_content = json.dumps(history, ensure_ascii=False, indent=2, default=json_serializer)
+    history_content = json.dumps(
+        history, ensure_ascii=False, separators=COMPACT_JSON_SEPARATORS, default=json_serializer
+    )
     messages.extend(create_pseudo_tool_call("get_recent_history", history_content))
 
     # 4. Current User Query
@@ -165,7 +183,7 @@ def build_o4_mini_payload(
 
 
 def build_payload(
-    user_id: str,
+    system_prompt: str,
     current_user_query: str,
     history: List[Dict[str, Any]],
     o4_mini_summary: Optional[str] = None,
@@ -173,19 +191,16 @@ def build_payload(
     """
     Builds the complete message payload for the OpenAI API call.
     Optionally includes a summary from the o4-mini model via a pseudo tool call.
+    The system prompt is the user's resolved prompt; the caller applies the default.
     """
     messages = []
 
     # 1. System Prompt
-    system_prompt = get_system_prompt(user_id)
-    if not system_prompt:
-        system_prompt = DEFAULT_SYSTEM_PROMPT
-        set_system_prompt(user_id, system_prompt)
     messages.append({"role": "system", "content": system_prompt})
 
     # 2. Add summary from o4-mini as a pseudo tool call if available
     if o4_mini_summary:
-        tool_call_id = f"call_{uuid.uuid4().hex}"
+        tool_call_id = make_tool_call_id("get_co_therapist_help")
         messages.append(
             {
                 "role": "assistant",
@@ -212,7 +227,7 @@ def build_payload(
 
     # 3. Current UTC time and date (pseudo tool call)
     utc_time_str = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S %Z")
-    time_tool_call_id = f"call_{uuid.uuid4().hex}"
+    time_tool_call_id = make_tool_call_id("get_current_time")
     messages.append(
         {
             "role": "assistant",
@@ -239,12 +254,13 @@ def build_payload(
 
     # 4. Last 6 messages from history
     if history:
-        cleaned_history = []
-        for msg in history:
-            if msg.get("role") and msg.get("content"):
-                cleaned_history.append({"role": msg["role"], "content": msg["content"]})
+        cleaned_history = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in history
+            if msg.get("role") and msg.get("content")
+        ]
         messages.extend(cleaned_history)
-        logger.info(f"Loaded {len(cleaned_history)} messages from history.")
+        logger.info("Loaded %d messages from history.", len(cleaned_history))
 
     # 5. Current user query
     messages.append({"role": "user", "content": current_user_query})
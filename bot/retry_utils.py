@@ -1,17 +1,57 @@
 import asyncio
+import contextlib
+import contextvars
 import logging
 import time
 import functools
-from typing import Callable, TypeVar, cast
+import random
+import re
+from typing import Callable, Optional, TypeVar, cast
 from config import config
 import ssl
 import requests
+from google.api_core.exceptions import InvalidArgument, PermissionDenied, Unauthenticated
 from google.auth.exceptions import TransportError
+from telegram.error import RetryAfter
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar("T")
 
+# Loop-time deadline for the calls being made; retry_async won't back off past it
+_retry_deadline = contextvars.ContextVar("retry_deadline", default=None)
+
+
+@contextlib.contextmanager
+def retry_deadline(deadline: float):
+    """
+    Apply a loop-time retry deadline to the retry_async calls made inside the block.
+
+    The deadline is reset on exit, so calls made after the block (or by tasks
+    created before it) are not bound by it.
+    """
+    token = _retry_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _retry_deadline.reset(token)
+
+
+def get_retry_deadline() -> Optional[float]:
+    """Return the current task's retry deadline in loop time, if one was set"""
+    return _retry_deadline.get()
+
+
+# Programming/data errors and 4xx API rejections that fail the same way on every attempt
+NON_RETRYABLE_EXCEPTIONS = (
+    ValueError,
+    TypeError,
+    KeyError,
+    InvalidArgument,
+    PermissionDenied,
+    Unauthenticated,
+)
+
 # Define retryable exceptions that commonly occur with SSL/network issues
 RETRYABLE_EXCEPTIONS = (
     ssl.SSLError,
@@ -24,44 +64,77 @@ RETRYABLE_EXCEPTIONS = (
     ConnectionAbortedError,
 )
 
+# SSL/connection failures that surface only in the exception message
+_RETRYABLE_MESSAGE_RE = re.compile(
+    r"ssl|certificate|handshake|connection (?:reset|aborted)"
+    r"|eof occurred in violation|oauth2\.googleapis\.com|unexpected_eof_while_reading",
+    re.IGNORECASE,
+)
+
 def is_retryable_error(exception: Exception) -> bool:
     """Check if an exception is retryable"""
     if isinstance(exception, RETRYABLE_EXCEPTIONS):
         return True
     
     # Check for specific SSL error messages
-    error_str = str(exception).lower()
-    ssl_keywords = [
-        'ssl',
-        'certificate',
-        'handshake',
-        'connection reset',
-        'connection aborted',
-        'eof occurred in violation',
-        'oauth2.googleapis.com',
-        'unexpected_eof_while_reading'
-    ]
-    
-    return any(keyword in error_str for keyword in ssl_keywords)
+    return _RETRYABLE_MESSAGE_RE.search(str(exception)) is not None
+
+
+# Backoff multipliers per attempt, enumerated once; retry counts never get near the end
+_MAX_TABULATED_ATTEMPTS = 32
+_RETRYABLE_BACKOFF = tuple(1.5 ** i for i in range(_MAX_TABULATED_ATTEMPTS))
+_STANDARD_BACKOFF = tuple(2 ** i for i in range(_MAX_TABULATED_ATTEMPTS))
+_RETRYABLE_MAX_DELAY = 30.0
 
 
 def get_retry_delay(attempt: int, base_delay: float, exception: Exception) -> float:
-    """Calculate retry delay with exponential backoff"""
+    """Calculate retry delay with exponential backoff (attempt counts from 1)"""
+    index = max(min(attempt, _MAX_TABULATED_ATTEMPTS) - 1, 0)
     if is_retryable_error(exception):
         # Shorter delays for retryable errors
-        return min(base_delay * (1.5 ** (attempt - 1)), 30.0)
+        return min(base_delay * _RETRYABLE_BACKOFF[index], _RETRYABLE_MAX_DELAY)
     else:
         # Standard exponential backoff for other errors
-        return base_delay * (2 ** (attempt - 1))
+        return base_delay * _STANDARD_BACKOFF[index]
 
 
-def retry_sync(max_attempts: int = None, base_delay: float = None):
+def get_retry_after(exception: Exception) -> Optional[float]:
+    """Return the server-requested wait in seconds, if the exception carries one"""
+    # Telegram flood control
+    retry_after = getattr(exception, "retry_after", None)
+    if retry_after is not None:
+        if hasattr(retry_after, "total_seconds"):
+            return retry_after.total_seconds()
+        return float(retry_after)
+    
+    # HTTP errors exposing headers directly or via their response (OpenAI, requests)
+    headers = getattr(exception, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(exception, "response", None), "headers", None)
+    if headers is None:
+        return None
+    
+    try:
+        value = headers.get("Retry-After")
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def retry_sync(
+    max_attempts: int = None,
+    base_delay: float = None,
+    retry_on: tuple = (Exception,),
+    no_retry_on: tuple = NON_RETRYABLE_EXCEPTIONS,
+):
     """
     Decorator for synchronous functions to retry with exponential backoff
     
     Args:
         max_attempts: Maximum number of retry attempts
         base_delay: Base delay for exponential backoff in seconds
+        retry_on: Exception types worth retrying (default: all)
+        no_retry_on: Exception types re-raised immediately (default: NON_RETRYABLE_EXCEPTIONS)
     
     Returns:
         Decorated function
@@ -70,7 +143,19 @@ def retry_sync(max_attempts: int = None, base_delay: float = None):
     max_attempts = max_attempts or config.RETRY_ATTEMPTS
     base_delay = base_delay or config.RETRY_BASE_DELAY
     
+    # Delay schedules are fixed per decorated function, so build them once
+    # (same tables as get_retry_delay)
+    retryable_delays = tuple(
+        min(base_delay * factor, _RETRYABLE_MAX_DELAY)
+        for factor in _RETRYABLE_BACKOFF[:max_attempts - 1]
+    )
+    standard_delays = tuple(
+        base_delay * factor for factor in _STANDARD_BACKOFF[:max_attempts - 1]
+    )
+    
     def decorator(func):
+        func_name = func.__name__
+        
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             last_exception = None
@@ -82,30 +167,39 @@ def retry_sync(max_attempts: int = None, base_delay: float = None):
                     # If we're retrying and succeed, log the success
                     if attempt > 1:
                         logger.info(
-                            f"Successfully executed {func.__name__} "
-                            f"on attempt {attempt}"
+                            "Successfully executed %s on attempt %d", func_name, attempt
                         )
                     
                     return result
                 
                 except Exception as e:
+                    # Permanent failures would fail the same way again
+                    if isinstance(e, no_retry_on) or not isinstance(e, retry_on):
+                        raise
+                    
                     last_exception = e
                     
                     # Don't sleep if this is the last attempt
                     if attempt < max_attempts:
-                        delay = get_retry_delay(attempt, base_delay, e)
-                        log_message = (
-                            f"Attempt {attempt}/{max_attempts} for {func.__name__} "
-                            f"failed with error: {str(e)}. Retrying in {delay:.2f}s"
+                        delays = retryable_delays if is_retryable_error(e) else standard_delays
+                        delay = delays[attempt - 1]
+                        
+                        # Jitter so concurrent callers don't retry in lockstep
+                        delay = random.uniform(delay * 0.5, delay * 1.5)
+                        retry_after = get_retry_after(e)
+                        if retry_after is not None:
+                            delay = max(delay, retry_after)
+                        
+                        logger.warning(
+                            "Attempt %d/%d for %s failed with error: %s. Retrying in %.2fs",
+                            attempt, max_attempts, func_name, e, delay,
                         )
-                        logger.warning(log_message)
                         time.sleep(delay)
                     else:
-                        log_message = (
-                            f"All {max_attempts} attempts for {func.__name__} "
-                            f"failed. Last error: {str(e)}"
+                        logger.error(
+                            "All %d attempts for %s failed. Last error: %s",
+                            max_attempts, func_name, e,
                         )
-                        logger.error(log_message)
             
             # All attempts failed
             raise last_exception
@@ -121,6 +215,10 @@ def retry_async(
     max_delay: float = 60.0,  # Reduced from default to prevent long delays
     exponential_base: float = 2.0,
     exceptions: tuple = None,
+    no_retry_on: tuple = NON_RETRYABLE_EXCEPTIONS,
+    per_attempt_timeout: float = None,
+    total_deadline: float = None,
+    deadline_getter: Callable[[], Optional[float]] = get_retry_deadline,
 ):
     """
     Async retry decorator with exponential backoff and jitter.
@@ -131,6 +229,11 @@ def retry_async(
         max_delay: Maximum delay in seconds (default: 60.0, reduced for Cloud Run)
         exponential_base: Base for exponential backoff (default: 2.0)
         exceptions: Tuple of exception types to retry on (default: retryable exceptions)
+        no_retry_on: Exception types re-raised immediately even if listed in exceptions
+        per_attempt_timeout: Seconds before a single attempt is cancelled and counted as a timeout
+        total_deadline: Seconds for all attempts and backoff together; no retry starts past it
+        deadline_getter: Returns an absolute loop-time deadline shared by the caller
+            (default: the deadline applied with retry_deadline)
     """
     if exceptions is None:
         # Only retry on specific exceptions, not all exceptions
@@ -138,50 +241,90 @@ def retry_async(
             # Add OpenAI specific exceptions that might be retryable
             TimeoutError,
             ConnectionError,
+            # Telegram flood control; the wait comes from its retry_after
+            RetryAfter,
         )
     
+    # Backoff before each retry is fixed per decorated function, so build it once
+    delays = tuple(
+        min(base_delay * (exponential_base ** attempt), max_delay)
+        for attempt in range(max_attempts - 1)
+    )
+    
     def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        func_name = func.__name__
+        
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> T:
             last_exception = None
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + total_deadline if total_deadline else None
             
             for attempt in range(max_attempts):
                 try:
+                    if per_attempt_timeout:
+                        return await asyncio.wait_for(
+                            func(*args, **kwargs), timeout=per_attempt_timeout
+                        )
                     return await func(*args, **kwargs)
                 except exceptions as e:
+                    if isinstance(e, no_retry_on):
+                        raise
+                    
                     last_exception = e
                     
                     if attempt == max_attempts - 1:
                         logger.error(
-                            f"Function {func.__name__} failed after {max_attempts} attempts. "
-                            f"Final error: {e}"
+                            "Function %s failed after %d attempts. Final error: %s",
+                            func_name, max_attempts, e,
                         )
                         raise
                     
-                    # Only log retryable errors, not all exceptions
-                    if is_retryable_error(e):
+                    # Classifying the error scans its message, so only do it when the log is kept
+                    if logger.isEnabledFor(logging.WARNING):
                         logger.warning(
-                            f"Retryable error in {func.__name__} (attempt {attempt + 1}/{max_attempts}): {e}"
-                        )
-                    else:
-                        logger.warning(
-                            f"Error in {func.__name__} (attempt {attempt + 1}/{max_attempts}): {e}"
+                            "%s in %s (attempt %d/%d): %s",
+                            "Retryable error" if is_retryable_error(e) else "Error",
+                            func_name, attempt + 1, max_attempts, e,
                         )
                     
-                    # Calculate delay with exponential backoff and jitter
-                    delay = min(
-                        base_delay * (exponential_base ** attempt),
-                        max_delay
-                    )
+                    # Exponential backoff from the precomputed schedule
+                    delay = delays[attempt]
                     
                     # Add jitter to prevent thundering herd
-                    jittered_delay = delay * (0.5 + 0.5 * (hash(str(args) + str(kwargs)) % 100) / 100)
+                    jittered_delay = delay * (0.5 + 0.5 * random.random())
+                    
+                    # Honour the server's Retry-After when it asks for a longer wait
+                    retry_after = get_retry_after(e)
+                    if retry_after is not None:
+                        jittered_delay = max(jittered_delay, retry_after)
+                    
+                    # Don't start an attempt the overall budget can no longer cover
+                    if deadline is not None and loop.time() + jittered_delay >= deadline:
+                        logger.error(
+                            "Function %s exceeded its %ss retry budget. Final error: %s",
+                            func_name, total_deadline, e,
+                        )
+                        raise
+                    
+                    # Fit the backoff into the caller's remaining budget
+                    outer_deadline = deadline_getter() if deadline_getter else None
+                    if outer_deadline is not None:
+                        remaining = outer_deadline - loop.time()
+                        # Never retry sooner than the server asked; give up instead
+                        if remaining <= 0 or (retry_after is not None and retry_after > remaining):
+                            logger.error(
+                                "Function %s ran out of request time. Final error: %s",
+                                func_name, e,
+                            )
+                            raise
+                        jittered_delay = max(min(jittered_delay, remaining * 0.8), retry_after or 0)
                     
-                    logger.info(f"Retrying {func.__name__} in {jittered_delay:.2f} seconds...")
+                    logger.info("Retrying %s in %.2f seconds...", func_name, jittered_delay)
                     await asyncio.sleep(jittered_delay)
                 except Exception as e:
                     # For non-retryable exceptions, fail immediately
-                    logger.error(f"Non-retryable error in {func.__name__}: {e}")
+                    logger.error("Non-retryable error in %s: %s", func_name, e)
                     raise
             
             # This should never be reached due to the raise in the loop
@@ -1,6 +1,6 @@
 from typing import Literal, Optional, List
 from enum import Enum
-from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, field_validator, model_validator
 
 # The fixed list of categories is no longer needed.
 # Priority = Literal["Critical", "High", "Mid", "Low"]
@@ -8,6 +8,13 @@ from pydantic import BaseModel, Field, field_validator, model_validator
 Priority = Literal["Critical", "High", "Mid", "Low"]
 
 
+def _drop_null_key(data, key):
+    """Remove a null `key` so AliasChoices falls through to the alias instead of failing"""
+    if isinstance(data, dict) and key in data and data[key] is None:
+        data = {k: v for k, v in data.items() if k != key}
+    return data
+
+
 class Factology(BaseModel):
     """
     A structured representation of a single, meaningful fact extracted from a user's message.
@@ -17,8 +24,10 @@ class Factology(BaseModel):
         ...,
         description="The high-level category of the fact (e.g., 'personal_history', 'emotions', 'life_events').",
     )
-    content: Optional[str] = Field(
-        default=None,
+    # The model sometimes hallucinates 'description', so it is accepted as an alias for 'content'.
+    content: str = Field(
+        ...,
+        validation_alias=AliasChoices("content", "description"),
         description="A concise summary of the extracted fact, written in the third person (e.g., 'User is feeling anxious about work.').",
     )
     priority: Priority = Field(
@@ -26,8 +35,13 @@ class Factology(BaseModel):
         description="The assessed priority of this fact for the therapist's attention.",
     )
 
-    # The model sometimes hallucinates 'description', so we accept it as an alias for 'content'.
-    description: Optional[str] = Field(default=None, description="Alias for 'content'.")
+    model_config = ConfigDict(populate_by_name=True)
+
+    @model_validator(mode="before")
+    @classmethod
+    def fallback_to_description(cls, data):
+        """A null 'content' next to a 'description' still uses the description."""
+        return _drop_null_key(data, "content")
 
     @field_validator("priority", mode="before")
     @classmethod
@@ -42,21 +56,6 @@ class Factology(BaseModel):
 
         return normalized_v
 
-    @model_validator(mode="after")
-    def consolidate_content(self):
-        """Ensure 'content' is populated, using 'description' as a fallback."""
-        if self.content is None and self.description is not None:
-            self.content = self.description
-
-        if self.content is None:
-            raise ValueError(
-                "Either 'content' or 'description' must be provided in factology."
-            )
-
-        # Clean up the model by removing the alias field
-        self.description = None
-        return self
-
 
 class ResponseMode(str, Enum):
     VOICE = "voice"
@@ -66,11 +65,12 @@ class ResponseMode(str, Enum):
 class AnalysisResult(BaseModel):
     """Complete analysis of a user's message."""
 
-    response: Optional[str] = Field(
-        default=None,
+    # The model sometimes answers with 'text_to_client', so it is accepted as an alias for 'response'.
+    response: str = Field(
+        ...,
+        validation_alias=AliasChoices("response", "text_to_client"),
         description="A supportive and empathetic reply for the user.",
     )
-    text_to_client: Optional[str] = Field(default=None, description="Alias for 'response'.")
     response_mode: Optional[ResponseMode] = Field(
         default=None,
         description="Preferred delivery format (voice or text). Optional.",
@@ -80,20 +80,13 @@ class AnalysisResult(BaseModel):
         description="A list of structured fact objects. Must be null if no specific, meaningful fact is identified.",
     )
 
-    @model_validator(mode="after")
-    def consolidate_response(self):
-        """Ensure 'response' is populated, using 'text_to_client' as a fallback."""
-        if self.response is None and self.text_to_client is not None:
-            self.response = self.text_to_client
+    model_config = ConfigDict(extra="ignore", populate_by_name=True)
 
-        if self.response is None:
-            raise ValueError(
-                "Either 'response' or 'text_to_client' must be provided."
-            )
-
-        # Clean up the model by removing the alias field
-        self.text_to_client = None
-        return self
+    @model_validator(mode="before")
+    @classmethod
+    def fallback_to_text_to_client(cls, data):
+        """A null 'response' next to a 'text_to_client' still uses the latter."""
+        return _drop_null_key(data, "response")
 
 
 # This is the tool schema that will be passed to the OpenAI API
@@ -104,3 +97,6 @@ tools_schema[0]["function"]["name"] = "process_user_message"
 tools_schema[0]["function"][
     "description"
 ] = "Processes the user's message to formulate a reply and extract key facts."
+
+# Forces the model to answer through the tool above; built once and reused per request
+tool_choice = {"type": "function", "function": {"name": "process_user_message"}}
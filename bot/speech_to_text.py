@@ -5,19 +5,42 @@ from bot.retry_utils import retry_async
 
 logger = logging.getLogger(__name__)
 
-@retry_async()
+# Whisper client will be initialized lazily and reused across transcriptions
+_client = None
+
+
+def get_client():
+    """Get the Whisper HTTP client, creating it if needed"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close_client():
+    """Close the Whisper HTTP client if it was created"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+@retry_async(per_attempt_timeout=60)
 async def transcribe_audio(audio_bytes: bytes, filename: str = "voice.ogg") -> str:
     """Send audio to Groq Whisper API and return the transcribed text."""
     url = Config.GROQ_WHISPER_URL
     headers = {"Authorization": f"Bearer {Config.GROQ_API_KEY}"}
-    data = {"model": "whisper-large-v3-turbo"}
+    # Plain "json" carries only the text; verbose_json would add segments and timings
+    data = {"model": "whisper-large-v3-turbo", "response_format": "json"}
     files = {"file": (filename, audio_bytes, "audio/ogg; codecs=opus")}
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        response = await client.post(url, headers=headers, data=data, files=files)
-        response.raise_for_status()
-        result = response.json()
-        text = result.get("text", "").strip()
-        if not text:
-            raise ValueError("Empty transcription")
-        return text
+    response = await get_client().post(url, headers=headers, data=data, files=files)
+    response.raise_for_status()
+    result = response.json()
+    text = result.get("text", "").strip()
+    if not text:
+        raise ValueError("Empty transcription")
+    return text
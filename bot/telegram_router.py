@@ -1,11 +1,15 @@
 import logging
 import asyncio
+import collections
 import json
 import os
+import re
 import time
+import weakref
 
 # from datetime import datetime # Unused
 from telegram import Update
+from telegram.error import RetryAfter
 from telegram.ext import (
     Application,
     MessageHandler,
@@ -18,29 +22,28 @@ from telegram.ext import (
 
 from bot.firestore_client import (
     get_history,
-    get_history_async,
-    add_message_with_timestamp,
+    get_recent_history_async,
+    add_messages_with_timestamp,
     get_system_prompt,
     set_system_prompt,
     get_facts,
     get_facts_async,
     get_user_settings,
     set_user_settings,
-    has_processed_update,
-    mark_update_processed,
+    try_claim_update,
 )
 from bot.openai_client import (
     get_o4_mini_summary,
     get_o3_response_tool,
     ask_o3_with_image,
 )
-from bot.retry_utils import retry_async
+from bot.retry_utils import get_retry_after, retry_async, retry_deadline
 from bot.prompt_builder import build_o4_mini_payload, build_payload
 from bot.factology_manager import FactologyManager
 from bot.schemas import AnalysisResult, ResponseMode
 from bot.speech_to_text import transcribe_audio
-from bot.text_to_speech import generate_speech
 from io import BytesIO
+from config import Config, DEFAULT_SYSTEM_PROMPT
 
 logger = logging.getLogger(__name__)
 
@@ -52,6 +55,53 @@ MESSAGE_BUFFER_TIMEOUT = 5  # seconds to wait for additional parts
 MESSAGE_BUFFER_MAX_LENGTH = 40000  # limit to avoid huge buffers
 _message_buffers = {}
 
+# Streaming of the o3 reply into a live-edited Telegram message
+STREAM_EDIT_INTERVAL = 1.0  # seconds between preview edits (Telegram flood limits)
+_REPLY_FIELD_RE = re.compile(r'"(?:response|text_to_client)"\s*:\s*"')
+
+# One lock per user so a user's turns are answered one at a time; idle locks
+# are dropped automatically once no task holds them
+_user_locks = weakref.WeakValueDictionary()
+
+# In-flight history writes by user; holding the task here also keeps it from being
+# garbage-collected, and the user's next turn waits on it before reading history
+_pending_history_writes = {}
+
+# Recently handled update ids, so redeliveries to this instance are dropped
+# without the Firestore idempotency round-trips
+_seen_updates = collections.OrderedDict()
+SEEN_UPDATES_MAX = 10000
+
+# Update payload keys that carry a message our Message/Command handlers can match
+MESSAGE_UPDATE_KEYS = ("message", "edited_message", "channel_post", "edited_channel_post")
+
+# Number of latest history messages passed to the models each turn
+RECENT_HISTORY_LIMIT = 6
+
+WELCOME_TEMPLATE = (
+    "Hello {user_name}! 👋\n\n"
+    "Welcome to your AI Therapist! I'm here to provide compassionate support "
+    "and guidance whenever you need it.\n\n"
+    "Just send me a message and I'll respond with care and understanding.\n\n"
+    "Type /help to see available commands."
+)
+
+# Reply-mode commands and the reply_mode setting each one stores (None = model decides)
+REPLY_MODE_COMMANDS = {"voice": "voice", "text": "text", "auto": None}
+
+HELP_TEXT = (
+    "Here are the available commands:\n\n"
+    "/start - Start or restart the bot\n"
+    "/help  - Show this help message\n"
+    "/voice - always respond with voice\n"
+    "/text  - always respond with text\n"
+    "/auto  - let the model decide\n\n"
+    "I'm your AI therapist, here to provide compassionate support. "
+    "Just send me any message to start our conversation! \ud83d\udc9a\n"
+    "You can also send voice messages, and I'll transcribe them for you.\n"
+    "You can send photos too — I can analyze them."
+)
+
 
 def get_factology_manager():
     """Get FactologyManager instance, creating it if needed"""
@@ -63,34 +113,53 @@ def get_factology_manager():
             _factology_manager = FactologyManager(firestore_client)
             logger.info("FactologyManager initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize FactologyManager: {e}")
+            logger.error("Failed to initialize FactologyManager: %s", e)
             raise
     return _factology_manager
 
 
+def _remember_update(update_id: int) -> None:
+    """Record an update id as handled, evicting the oldest beyond SEEN_UPDATES_MAX"""
+    _seen_updates[update_id] = None
+    _seen_updates.move_to_end(update_id)
+    if len(_seen_updates) > SEEN_UPDATES_MAX:
+        _seen_updates.popitem(last=False)
+
+
 async def handle_update(update_data: dict, telegram_bot: Application) -> None:
     """Handle Telegram update with idempotency check"""
     try:
         # Create Update object from JSON data
         update = Update.de_json(update_data, telegram_bot.bot)
 
+        # Only message updates reach our handlers; anything else (reactions, member
+        # changes, ...) is passed through without the idempotency round-trip
+        if not any(key in update_data for key in MESSAGE_UPDATE_KEYS):
+            await telegram_bot.process_update(update)
+            return
+
         # Get update_id for idempotency
         update_id = update.update_id
 
         # Check if we've already processed this update
-        if has_processed_update(update_id):
-            logger.info(f"Update {update_id} already processed, skipping")
+        if update_id in _seen_updates:
+            _seen_updates.move_to_end(update_id)
+            logger.info("Update %s already processed, skipping", update_id)
             return
+        # Remember it before awaiting so a concurrent redelivery is dropped here too
+        _remember_update(update_id)
 
-        # Mark update as processed before handling to prevent duplicates
-        mark_update_processed(update_id)
-        logger.info(f"Processing update {update_id}")
+        # Claim the update in Firestore before handling it to prevent duplicates
+        if not await asyncio.to_thread(try_claim_update, update_id):
+            logger.info("Update %s already processed, skipping", update_id)
+            return
+        logger.info("Processing update %s", update_id)
 
         # Process the update
         await telegram_bot.process_update(update)
 
     except Exception as e:
-        logger.error(f"Error processing update in background: {e}")
+        logger.error("Error processing update in background: %s", e)
 
 
 async def keep_typing(context, chat_id, interval=5):
@@ -106,7 +175,7 @@ async def keep_typing(context, chat_id, interval=5):
         # This is expected when the task is cancelled
         pass
     except Exception as e:
-        logger.debug(f"Typing task error (not critical): {e}")
+        logger.debug("Typing task error (not critical): %s", e)
 
 
 def split_long_message(text, max_length=4000):
@@ -152,7 +221,209 @@ def split_long_message(text, max_length=4000):
     return chunks
 
 
+def extract_partial_reply(arguments):
+    """
+    Extract the reply text from partially streamed tool call arguments
+
+    Args:
+        arguments (str): The JSON arguments of the tool call received so far
+
+    Returns:
+        str or None: The reply text decoded so far, or None if it hasn't started yet
+    """
+    match = _REPLY_FIELD_RE.search(arguments)
+    if not match:
+        return None
+
+    raw = arguments[match.end():]
+    end = len(raw)
+    last_escape = -1
+    i = 0
+    while i < end:
+        if raw[i] == "\\":
+            last_escape = i
+            i += 2
+        elif raw[i] == '"':
+            end = i
+            break
+        else:
+            i += 1
+    else:
+        # The string is still open, so drop an unfinished escape sequence
+        if i > end or (
+            last_escape >= 0 and raw[last_escape + 1] == "u" and end - last_escape < 6
+        ):
+            end = last_escape
+
+    try:
+        return json.loads('"' + raw[:end] + '"')
+    except ValueError:
+        return None
+
+
+class TelegramPacer:
+    """
+    Paces outgoing Telegram API calls for the whole process.
+
+    Caps how many calls are in flight at once, and when Telegram answers one of
+    them with flood control, holds back every sender until retry_after elapses
+    so the retries don't arrive as a burst.
+    """
+
+    def __init__(self, max_concurrent):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._pause_until = 0.0
+
+    def pause(self, seconds):
+        """Stop all sends for the given number of seconds"""
+        self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+
+    async def _wait_for_pause(self):
+        while (remaining := self._pause_until - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+
+    async def __aenter__(self):
+        await self._wait_for_pause()
+        await self._semaphore.acquire()
+        try:
+            # A pause may have started while we queued for a slot
+            await self._wait_for_pause()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._semaphore.release()
+        if isinstance(exc, RetryAfter):
+            self.pause(get_retry_after(exc) or 0)
+        return False
+
+
+# Shared by every send/edit so bursts stay under Telegram's flood limits
+_telegram_pacer = TelegramPacer(Config.TELEGRAM_MAX_CONCURRENT_SENDS)
+TELEGRAM_SEND_TIMEOUT = 30  # seconds for a single send_message call, excluding pacing
+
+
+class StreamingReply:
+    """Shows a reply to the user while it streams in by editing one Telegram message"""
+
+    def __init__(self, context, chat_id):
+        self.context = context
+        self.chat_id = chat_id
+        self.message = None
+        self.shown_text = ""
+        # Preview edits run in their own task, so a slow edit or a flood pause
+        # never holds up reading the OpenAI stream; it only keeps the latest text
+        self._latest_arguments = None
+        self._changed = asyncio.Event()
+        self._closed = asyncio.Event()
+        self._task = None
+
+    async def update(self, arguments):
+        """Record the tool call arguments received so far for the next preview edit"""
+        self._latest_arguments = arguments
+        self._changed.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            if self._closed.is_set():
+                return
+            await self._refresh()
+            # Throttle edits (Telegram flood limits), but stop at once when closed
+            try:
+                await asyncio.wait_for(self._closed.wait(), STREAM_EDIT_INTERVAL)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self):
+        text = extract_partial_reply(self._latest_arguments)
+        if not text or not text.strip():
+            return
+        text = split_long_message(text)[0]
+        if text == self.shown_text:
+            return
+        try:
+            await self._show(text)
+        except Exception as e:
+            logger.debug("Streaming preview update failed (not critical): %s", e)
+
+    async def _stop(self):
+        """Stop the preview task, letting an edit that is already in flight finish"""
+        self._closed.set()
+        self._changed.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def finish(self, text):
+        """
+        Replace the preview with the final reply
+
+        Returns:
+            bool: False if the reply still has to be sent, i.e. no preview was shown
+            or it could not be replaced (the truncated preview is then removed)
+        """
+        await self._stop()
+        if self.message is None:
+            return False
+
+        chunks = split_long_message(text)
+        try:
+            await self._show(chunks[0])
+        except Exception as e:
+            logger.warning("Could not finalize streamed reply, resending it: %s", e)
+            await self.discard()
+            return False
+        self.message = None
+
+        for chunk in chunks[1:]:
+            await safe_send_message(self.context, self.chat_id, chunk)
+        return True
+
+    async def discard(self):
+        """Remove the preview, e.g. when the reply is delivered as voice instead"""
+        await self._stop()
+        if self.message is None:
+            return
+        try:
+            await self.context.bot.delete_message(
+                chat_id=self.chat_id, message_id=self.message.message_id
+            )
+        except Exception as e:
+            logger.debug("Could not delete streaming preview (not critical): %s", e)
+        self.message = None
+
+    async def _show(self, text):
+        if self.message is None:
+            async with _telegram_pacer:
+                self.message = await self.context.bot.send_message(
+                    chat_id=self.chat_id, text=text
+                )
+        elif text != self.shown_text:
+            async with _telegram_pacer:
+                await self.context.bot.edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message.message_id, text=text
+                )
+        self.shown_text = text
+
+
 @retry_async()
+async def _send_chunk(context, chat_id, text, **kwargs):
+    """Send one message, retrying just this chunk so earlier chunks are never resent"""
+    async with _telegram_pacer:
+        # Time only the API call; a flood pause in the pacer can legitimately be longer
+        return await asyncio.wait_for(
+            context.bot.send_message(chat_id=chat_id, text=text, **kwargs),
+            timeout=TELEGRAM_SEND_TIMEOUT,
+        )
+
+
 async def safe_send_message(context, chat_id, text, **kwargs):
     """
     Send a message with retry capability and automatic splitting for long messages
@@ -174,19 +445,25 @@ async def safe_send_message(context, chat_id, text, **kwargs):
         for i, chunk in enumerate(chunks):
             if i == 0:
                 # First chunk uses original kwargs
-                last_message = await context.bot.send_message(
-                    chat_id=chat_id, text=chunk, **kwargs
-                )
+                last_message = await _send_chunk(context, chat_id, chunk, **kwargs)
             else:
                 # Subsequent chunks without special formatting
-                last_message = await context.bot.send_message(
-                    chat_id=chat_id, text=chunk
-                )
+                last_message = await _send_chunk(context, chat_id, chunk)
 
         return last_message
     except Exception as e:
-        logger.error(f"Failed to send message to {chat_id}: {str(e)}")
-        raise  # Let the retry decorator handle retrying
+        logger.error("Failed to send message to %s: %s", chat_id, e)
+        raise
+
+
+def _get_or_create_system_prompt(user_id: str) -> str:
+    """Return the user's system prompt, storing the default for new users (blocking Firestore calls)."""
+    system_prompt = get_system_prompt(user_id)
+    if not system_prompt:
+        system_prompt = DEFAULT_SYSTEM_PROMPT
+        set_system_prompt(user_id, system_prompt)
+        logger.info("Set default system prompt for new user %s", user_id)
+    return system_prompt
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -194,43 +471,20 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user_id = str(update.effective_user.id)
     user_name = update.effective_user.first_name
 
-    welcome_message = (
-        f"Hello {user_name}! 👋\n\n"
-        f"Welcome to your AI Therapist! I'm here to provide compassionate support "
-        f"and guidance whenever you need it.\n\n"
-        f"Just send me a message and I'll respond with care and understanding.\n\n"
-        f"Type /help to see available commands."
-    )
-
+    welcome_message = WELCOME_TEMPLATE.format(user_name=user_name)
     await safe_send_message(context, update.effective_chat.id, welcome_message)
 
     # Initialize with default system prompt if user doesn't have one
-    from config import DEFAULT_SYSTEM_PROMPT
-    if not get_system_prompt(user_id):
-        set_system_prompt(user_id, DEFAULT_SYSTEM_PROMPT)
-        logger.info(f"Set default system prompt for new user {user_id}")
+    await asyncio.to_thread(_get_or_create_system_prompt, user_id)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Send a help message when the command /help is issued."""
-    help_message = (
-        "Here are the available commands:\n\n"
-        "/start - Start or restart the bot\n"
-        "/help  - Show this help message\n"
-        "/voice - always respond with voice\n"
-        "/text  - always respond with text\n"
-        "/auto  - let the model decide\n\n"
-        "I'm your AI therapist, here to provide compassionate support. "
-        "Just send me any message to start our conversation! \ud83d\udc9a\n"
-        "You can also send voice messages, and I'll transcribe them for you.\n"
-        "You can send photos too — I can analyze them."
-    )
-
-    await safe_send_message(context, update.effective_chat.id, help_message)
+    await safe_send_message(context, update.effective_chat.id, HELP_TEXT)
 
 
 async def _set_reply_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, mode: str | None):
-    set_user_settings(str(update.effective_user.id), {"reply_mode": mode})
+    await asyncio.to_thread(set_user_settings, str(update.effective_user.id), {"reply_mode": mode})
     await safe_send_message(
         context,
         update.effective_chat.id,
@@ -238,70 +492,203 @@ async def _set_reply_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, mo
     )
 
 
+async def reply_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Switch the reply mode when /voice, /text or /auto is issued."""
+    command = update.effective_message.text.split()[0][1:].split("@")[0].lower()
+    await _set_reply_mode(update, context, REPLY_MODE_COMMANDS[command])
+
+
+def _get_user_lock(user_id: str) -> asyncio.Lock:
+    """Get the lock serializing message processing for a user, creating it if needed"""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+
 async def _process_user_message(
     context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: str, user_message: str, image_data: bytes = None
+) -> None:
+    """
+    Process a user message, waiting for the user's previous message to finish first.
+
+    This keeps concurrent turns of the same user (e.g. a photo sent while a text
+    is being answered) from firing parallel OpenAI calls and interleaving replies;
+    the later turn also sees the earlier one in its history.
+    """
+    lock = _get_user_lock(user_id)
+    if lock.locked():
+        logger.info("Waiting for previous message of user %s to finish", user_id)
+    async with lock:
+        await _wait_for_history_write(user_id)
+        await _respond_to_user_message(context, chat_id, user_id, user_message, image_data)
+
+
+def _save_turn_in_background(user_id: str, user_text: str, assistant_text: str, timestamp) -> None:
+    """Write the exchange to history off the reply path."""
+    # One transaction for both messages: a single commit per turn
+    task = asyncio.create_task(
+        asyncio.to_thread(
+            add_messages_with_timestamp,
+            user_id,
+            [("user", user_text), ("assistant", assistant_text)],
+            timestamp,
+        )
+    )
+    _pending_history_writes[user_id] = task
+
+    def _on_done(done: asyncio.Task) -> None:
+        if _pending_history_writes.get(user_id) is done:
+            del _pending_history_writes[user_id]
+        if not done.cancelled() and done.exception():
+            logger.error("Failed to save history for user %s: %s", user_id, done.exception())
+
+    task.add_done_callback(_on_done)
+
+
+async def _wait_for_history_write(user_id: str) -> None:
+    """Wait until the user's previous exchange is in Firestore, ignoring its outcome."""
+    task = _pending_history_writes.get(user_id)
+    if task:
+        await asyncio.wait([task])
+
+
+async def drain_history_writes() -> None:
+    """Wait for all background history writes, e.g. before shutdown."""
+    if _pending_history_writes:
+        await asyncio.wait(list(_pending_history_writes.values()))
+
+
+def _manage_facts(user_id: str, summary_result) -> None:
+    """Apply o4-mini's fact updates, merges and pruning (blocking Firestore calls)."""
+    fact_manager = get_factology_manager()
+    if summary_result.references:
+        fact_manager.update_hot_scores(user_id, summary_result.references)
+    if summary_result.reorganisation:
+        fact_manager.merge_facts(user_id, summary_result.reorganisation)
+    fact_manager.prune_facts(user_id)
+
+
+async def _finish_fact_management(task) -> None:
+    """Wait for a background _manage_facts run, logging instead of raising its errors."""
+    if task is None:
+        return
+    try:
+        await task
+    except Exception as e:
+        logger.error("Could not manage facts: %s", e, exc_info=True)
+
+
+def _save_facts(user_id: str, facts) -> None:
+    """Save the facts extracted by o3 (blocking Firestore calls)."""
+    fact_manager = get_factology_manager()
+    saved_count = 0
+    for fact in facts:
+        try:
+            fact_manager.save_new_fact(
+                user_id=user_id,
+                fact_content=fact.content,
+                category=fact.category,
+                priority=fact.priority,
+            )
+            saved_count += 1
+        except Exception:
+            logger.error("Failed to save fact: %s", fact.content, exc_info=True)
+
+    if saved_count > 0:
+        logger.info("Saved %d new fact(s) for user %s.", saved_count, user_id)
+
+
+async def _respond_to_user_message(
+    context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: str, user_message: str, image_data: bytes = None
 ) -> None:
     """Core logic for processing a user message and responding."""
     start_time = time.time()
-    logger.info(f"[TIMING] Message handling started for user {user_id}")
+    logger.info("[TIMING] Message handling started for user %s", user_id)
+
+    # Retry budget for this turn's model calls, started once the user's lock is held.
+    # Telegram sends and Firestore writes keep their own retry limits.
+    model_retry_deadline = asyncio.get_running_loop().time() + Config.UPDATE_RETRY_BUDGET
 
     # Start a background task to send "typing..." action
     typing_task = asyncio.create_task(keep_typing(context, chat_id))
+    streaming_reply = None
+    fact_management_task = None
 
     try:
+        # Settings and the system prompt are only needed for the o3 step, so read
+        # them in worker threads while the o4-mini step runs
+        settings_task = asyncio.create_task(asyncio.to_thread(get_user_settings, user_id))
+        system_prompt_task = asyncio.create_task(
+            asyncio.to_thread(_get_or_create_system_prompt, user_id)
+        )
+
         # --- o4-mini Pre-processing Step ---
         o4_summary = None
+        recent_history = []
         try:
-            # 1. Fetch all necessary data: facts and recent history (ASYNC!)
+            # 1. Fetch all necessary data: facts and recent history, concurrently
             db_start = time.time()
-            facts = await get_facts_async(user_id)
-            history = await get_history_async(user_id)
-            recent_history = history[-6:]
-            logger.info(f"[TIMING] DB operations took {time.time() - db_start:.2f}s")
+            facts, recent_history = await asyncio.gather(
+                get_facts_async(user_id),
+                get_recent_history_async(user_id, RECENT_HISTORY_LIMIT),
+            )
+            logger.info("[TIMING] DB operations took %.2fs", time.time() - db_start)
 
             # 2. Build the payload for o4-mini
             payload_start = time.time()
             o4_payload = build_o4_mini_payload(user_message, facts, recent_history)
-            logger.info(f"[TIMING] Payload building took {time.time() - payload_start:.2f}s")
+            logger.info("[TIMING] Payload building took %.2fs", time.time() - payload_start)
 
             # 3. Call o4-mini to get summary and perform fact management
             if o4_payload:
                 o4_start = time.time()
                 logger.info("[TIMING] Starting o4-mini request...")
-                summary_result, _ = await get_o4_mini_summary(o4_payload)
-                logger.info(f"[TIMING] o4-mini request took {time.time() - o4_start:.2f}s")
+                with retry_deadline(model_retry_deadline):
+                    summary_result, _ = await get_o4_mini_summary(o4_payload)
+                logger.info("[TIMING] o4-mini request took %.2fs", time.time() - o4_start)
 
                 # 4. Use the summary and manage facts
                 if summary_result:
                     o4_summary = summary_result.summary
                     if summary_result.references:
                         o4_summary += f"\n(References: {summary_result.references})"
-                    logger.info(
-                        f"Successfully got summary from o4-mini for user {user_id}"
-                    )
+                    logger.info("Successfully got summary from o4-mini for user %s", user_id)
 
-                    # Perform fact management (updates, merges, pruning)
-                    fact_manager = get_factology_manager()
-                    if summary_result.references:
-                        fact_manager.update_hot_scores(
-                            user_id, summary_result.references
-                        )
-                    if summary_result.reorganisation:
-                        fact_manager.merge_facts(user_id, summary_result.reorganisation)
-                    fact_manager.prune_facts(user_id)
+                    # Fact management (updates, merges, pruning) only touches Firestore,
+                    # so let it run alongside the o3 call
+                    fact_management_task = asyncio.create_task(
+                        asyncio.to_thread(_manage_facts, user_id, summary_result)
+                    )
 
         except Exception as e:
             logger.error(
-                f"Could not get summary from o4-mini or manage facts: {e}",
-                exc_info=True,
+                "Could not get summary from o4-mini or manage facts: %s", e, exc_info=True
             )
 
         # --- o3 Therapist Model Step ---
-        last_6_messages = history[-6:]
-        payload = build_payload(user_id, user_message, last_6_messages, o4_summary)
+        user_settings, system_prompt = await asyncio.gather(settings_task, system_prompt_task)
+        user_settings = user_settings or {}
+        payload = build_payload(system_prompt, user_message, recent_history, o4_summary)
+
+        user_pref = user_settings.get("reply_mode")
+
+        # Stream the reply into a live-edited message only when it is known to be text;
+        # in auto mode o3 may still pick voice, and the preview would then vanish
+        if user_pref == "text":
+            streaming_reply = StreamingReply(context, chat_id)
 
         # Call the API with function calling enabled
-        message = await get_o3_response_tool(payload, image_data)
+        with retry_deadline(model_retry_deadline):
+            message = await get_o3_response_tool(
+                payload,
+                image_data,
+                on_delta=streaming_reply.update if streaming_reply else None,
+            )
+        # Finish fact management before o3's new facts are saved on top of it
+        await _finish_fact_management(fact_management_task)
+        fact_management_task = None
         bot_response_text = ""
         analysis = None
 
@@ -310,33 +697,14 @@ async def _process_user_message(
             tool_call = message.tool_calls[0]
             if tool_call.function.name == "process_user_message":
                 try:
-                    args = json.loads(tool_call.function.arguments)
-                    analysis = AnalysisResult.model_validate(args)
+                    analysis = AnalysisResult.model_validate_json(
+                        tool_call.function.arguments
+                    )
 
                     bot_response_text = analysis.response
 
                     if analysis.factology:
-                        fact_manager = get_factology_manager()
-                        saved_count = 0
-                        for fact in analysis.factology:
-                            try:
-                                fact_manager.save_new_fact(
-                                    user_id=user_id,
-                                    fact_content=fact.content,
-                                    category=fact.category,
-                                    priority=fact.priority,
-                                )
-                                saved_count += 1
-                            except Exception as e:
-                                logger.error(
-                                    f"Failed to save fact: {fact.content}",
-                                    exc_info=True,
-                                )
-
-                        if saved_count > 0:
-                            logger.info(
-                                f"Saved {saved_count} new fact(s) for user {user_id}."
-                            )
+                        await asyncio.to_thread(_save_facts, user_id, analysis.factology)
 
                 except Exception:
                     logger.error("Error processing tool call", exc_info=True)
@@ -349,13 +717,16 @@ async def _process_user_message(
         else:
             bot_response_text = "I'm not sure how to respond to that."
 
-        user_settings = get_user_settings(user_id) or {}
-        user_pref = user_settings.get("reply_mode")
         model_mode = analysis.response_mode.value if analysis and analysis.response_mode else None
         mode = user_pref or model_mode or "text"
 
         if mode == "voice" and os.getenv("DISABLE_TTS") != "True":
+            if streaming_reply:
+                await streaming_reply.discard()
             try:
+                # Imported on first voice reply: text-only instances never load the TTS module
+                from bot.text_to_speech import generate_speech
+
                 audio_bytes = await generate_speech(bot_response_text)
                 if audio_bytes and len(audio_bytes) > 50 * 1024 * 1024:
                     logger.warning("Voice message too large (>50MB). Sending text instead.")
@@ -363,28 +734,30 @@ async def _process_user_message(
                 elif audio_bytes:
                     voice_file = BytesIO(audio_bytes)
                     voice_file.name = "response.wav"
-                    await context.bot.send_voice(chat_id=chat_id, voice=voice_file)
+                    async with _telegram_pacer:
+                        await context.bot.send_voice(chat_id=chat_id, voice=voice_file)
                 else:
                     logger.error("TTS generation returned None")
                     await safe_send_message(context, chat_id, bot_response_text)
                     await safe_send_message(context, chat_id, "\u26a0\ufe0f Voice response unavailable.")
             except Exception as e:
-                logger.error(f"TTS generation failed: {e}")
+                logger.error("TTS generation failed: %s", e)
                 await safe_send_message(context, chat_id, bot_response_text)
                 await safe_send_message(context, chat_id, "\u26a0\ufe0f Voice response unavailable.")
-        else:
+        elif not (streaming_reply and await streaming_reply.finish(bot_response_text)):
             await safe_send_message(context, chat_id, bot_response_text)
 
-        # Save the interaction to history
+        # Save the interaction to history; the reply is already out, so don't wait on it
         from datetime import datetime, timezone
         timestamp = datetime.now(timezone.utc)
         # If image was provided, note it in the user message
         user_message_for_history = f"{user_message} (изображение)" if image_data else user_message
-        add_message_with_timestamp(user_id, "user", user_message_for_history, timestamp)
-        add_message_with_timestamp(user_id, "assistant", bot_response_text, timestamp)
+        _save_turn_in_background(user_id, user_message_for_history, bot_response_text, timestamp)
 
     except Exception as e:
-        logger.error(f"Error handling message for user {user_id}: {e}", exc_info=True)
+        logger.error("Error handling message for user %s: %s", user_id, e, exc_info=True)
+        if streaming_reply:
+            await streaming_reply.discard()
         error_message = (
             "I'm sorry, I've encountered a problem and can't respond right now. "
             "Please try again later."
@@ -397,6 +770,7 @@ async def _process_user_message(
             await typing_task
         except asyncio.CancelledError:
             pass
+        await _finish_fact_management(fact_management_task)
 
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -472,7 +846,8 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     logger.info(
-        f"Voice message from {user_id}, file_id={voice.file_unique_id} duration={voice.duration}s"
+        "Voice message from %s, file_id=%s duration=%ss",
+        user_id, voice.file_unique_id, voice.duration,
     )
 
     if voice.duration and voice.duration > 1200:
@@ -496,7 +871,7 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
         audio_bytes = bytes(await tfile.download_as_bytearray())
         text = await transcribe_audio(audio_bytes)
     except Exception as e:
-        logger.error(f"Voice transcription failed: {e}")
+        logger.error("Voice transcription failed: %s", e)
         await safe_send_message(context, chat_id, "Sorry, I couldn't process that audio message.")
         return
 
@@ -550,9 +925,10 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     try:
         photo = update.message.photo[-1]
         tfile = await photo.get_file()
-        img_bytes = bytes(await tfile.download_as_bytearray())
+        # Keep the downloaded bytearray as is; base64 encoding accepts it without a copy
+        img_bytes = await tfile.download_as_bytearray()
     except Exception as e:
-        logger.error(f"Failed to download photo: {e}")
+        logger.error("Failed to download photo: %s", e)
         await safe_send_message(context, chat_id, "Sorry, I couldn't process that image.")
         return
 
@@ -575,9 +951,7 @@ def setup_handlers(application: Application) -> None:
     # Add command handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
-    application.add_handler(CommandHandler("voice", lambda u, c: _set_reply_mode(u, c, "voice")))
-    application.add_handler(CommandHandler("text", lambda u, c: _set_reply_mode(u, c, "text")))
-    application.add_handler(CommandHandler("auto", lambda u, c: _set_reply_mode(u, c, None)))
+    application.add_handler(CommandHandler(list(REPLY_MODE_COMMANDS), reply_mode_command))
 
     # Add handler for regular text messages
     application.add_handler(
@@ -3,8 +3,9 @@ import struct
 import base64
 import logging
 from typing import Optional
-import aiohttp
+import httpx
 from config import Config
+from bot.http_client import get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -103,72 +104,70 @@ async def generate_speech(text: str, voice: str = "Enceladus") -> Optional[bytes
     }
     
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{Config.GEMINI_TTS_URL}?key={Config.GEMINI_API_KEY}",
-                json=payload,
-                headers=headers,
-                timeout=aiohttp.ClientTimeout(total=120)
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"TTS API error {response.status}: {error_text}")
-                    return None
-                
-                result = await response.json()
-                
-                # Extract audio data from response
+        response = await get_http_client().post(
+            f"{Config.GEMINI_TTS_URL}?key={Config.GEMINI_API_KEY}",
+            json=payload,
+            headers=headers,
+            timeout=120.0,
+        )
+        if response.status_code != 200:
+            logger.error("TTS API error %s: %s", response.status_code, response.text)
+            return None
+
+        result = response.json()
+        
+        # Extract audio data from response
+        try:
+            candidates = result.get("candidates", [])
+            if not candidates:
+                logger.error("No candidates in TTS response")
+                return None
+            
+            content = candidates[0].get("content", {})
+            parts = content.get("parts", [])
+            if not parts:
+                logger.error("No parts in TTS response content")
+                return None
+            
+            inline_data = parts[0].get("inlineData", {})
+            if not inline_data:
+                logger.error("No inlineData in TTS response")
+                return None
+            
+            audio_data_b64 = inline_data.get("data")
+            mime_type = inline_data.get("mimeType", "")
+            
+            if not audio_data_b64:
+                logger.error("No audio data in TTS response")
+                return None
+            
+            # Decode base64 audio data
+            pcm_data = base64.b64decode(audio_data_b64)
+            logger.info("Decoded %d bytes of PCM data, MIME type: %s", len(pcm_data), mime_type)
+            
+            # Parse sample rate from MIME type if available
+            sample_rate = 24000  # default
+            if "rate=" in mime_type:
                 try:
-                    candidates = result.get("candidates", [])
-                    if not candidates:
-                        logger.error("No candidates in TTS response")
-                        return None
-                    
-                    content = candidates[0].get("content", {})
-                    parts = content.get("parts", [])
-                    if not parts:
-                        logger.error("No parts in TTS response content")
-                        return None
-                    
-                    inline_data = parts[0].get("inlineData", {})
-                    if not inline_data:
-                        logger.error("No inlineData in TTS response")
-                        return None
-                    
-                    audio_data_b64 = inline_data.get("data")
-                    mime_type = inline_data.get("mimeType", "")
-                    
-                    if not audio_data_b64:
-                        logger.error("No audio data in TTS response")
-                        return None
-                    
-                    # Decode base64 audio data
-                    pcm_data = base64.b64decode(audio_data_b64)
-                    logger.info(f"Decoded {len(pcm_data)} bytes of PCM data, MIME type: {mime_type}")
-                    
-                    # Parse sample rate from MIME type if available
-                    sample_rate = 24000  # default
-                    if "rate=" in mime_type:
-                        try:
-                            rate_part = [part for part in mime_type.split(";") if "rate=" in part][0]
-                            sample_rate = int(rate_part.split("=")[1])
-                        except (IndexError, ValueError):
-                            logger.warning(f"Could not parse sample rate from MIME type: {mime_type}")
-                    
-                    # Convert L16 PCM to WAV
-                    wav_data = convert_l16_to_wav(pcm_data, sample_rate=sample_rate)
-                    logger.info(f"Converted to WAV format: {len(wav_data)} bytes")
-                    
-                    return wav_data
-                    
-                except KeyError as e:
-                    logger.error(f"Missing key in TTS response: {e}")
-                    logger.error(f"Response structure: {result}")
-                    return None
-                    
-    except aiohttp.ClientError as e:
-        logger.error(f"HTTP error during TTS generation: {e}")
+                    rate_part = [part for part in mime_type.split(";") if "rate=" in part][0]
+                    sample_rate = int(rate_part.split("=")[1])
+                except (IndexError, ValueError):
+                    logger.warning("Could not parse sample rate from MIME type: %s", mime_type)
+            
+            # Convert L16 PCM to WAV
+            wav_data = convert_l16_to_wav(pcm_data, sample_rate=sample_rate)
+            logger.info("Converted to WAV format: %d bytes", len(wav_data))
+            
+            return wav_data
+            
+        except KeyError as e:
+            logger.error("Missing key in TTS response: %s", e)
+            logger.error("Response structure: %s", result)
+            return None
+            
+    except httpx.HTTPError as e:
+        logger.error("HTTP error during TTS generation: %s", e)
         return None
     except Exception as e:
-        logger.error(f"Unexpected error during TTS generation: {e}")
+        logger.error("Unexpected error during TTS generation: %s", e)
         return None
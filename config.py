@@ -1,4 +1,5 @@
 import os
+import functools
 from dotenv import load_dotenv
 import logging
 
@@ -10,8 +11,6 @@ logging.basicConfig(
 # Suppress noisy HTTP request logs
 logging.getLogger("httpx").setLevel(logging.WARNING)
 logging.getLogger("httpcore").setLevel(logging.WARNING)
-logging.getLogger("aiohttp").setLevel(logging.WARNING)
-logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
 
 
 # Load environment variables from .env file first
@@ -24,6 +23,7 @@ google_app_creds_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 # Check if running on Cloud Run (has metadata server)
 
 
+@functools.lru_cache(maxsize=None)
 def is_running_on_cloud_run():
     try:
         import requests
@@ -64,10 +64,14 @@ class Config:
     # Telegram Bot credentials
     TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN") or os.getenv("TELEGRAM_TOKEN")
     TELEGRAM_BOT_TOKEN_LOCAL = os.getenv("TELEGRAM_BOT_TOKEN_LOCAL")
+    # Outgoing Telegram API calls in flight at once (bot-wide limit is ~30 msg/s)
+    TELEGRAM_MAX_CONCURRENT_SENDS = int(os.getenv("TELEGRAM_MAX_CONCURRENT_SENDS", "25"))
 
     # OpenAI API credentials
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "o3")
+    # User messages up to this length get low reasoning effort on o3
+    LOW_EFFORT_MAX_CHARS = int(os.getenv("LOW_EFFORT_MAX_CHARS", "200"))
 
     # Groq Whisper configuration
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -88,19 +92,32 @@ class Config:
     # Firebase configuration
     FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
     GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    FIRESTORE_POOL_SIZE = int(os.getenv("FIRESTORE_POOL_SIZE", "4"))
+    # Seconds a user's system prompt is served from memory before re-reading Firestore
+    SYSTEM_PROMPT_CACHE_TTL = float(os.getenv("SYSTEM_PROMPT_CACHE_TTL", "300"))
+    # Seconds a user's settings (reply mode) are served from memory
+    USER_SETTINGS_CACHE_TTL = float(os.getenv("USER_SETTINGS_CACHE_TTL", "60"))
 
     # Retry configuration
     RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
     RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "1.0"))
+    # Seconds of retry budget for the model calls of one user turn (o3 alone may take minutes)
+    UPDATE_RETRY_BUDGET = float(os.getenv("UPDATE_RETRY_BUDGET", "300"))
 
     # History and Summarization configuration
     HISTORY_THRESHOLD_MESSAGES = int(os.getenv("HISTORY_THRESHOLD_MESSAGES", "50"))
     MESSAGES_TO_SUMMARIZE_COUNT = int(os.getenv("MESSAGES_TO_SUMMARIZE_COUNT", "30"))
     MAX_SUMMARIES = int(os.getenv("MAX_SUMMARIES", "5"))
 
+    # Seconds between fact pruning passes for the same user
+    FACT_PRUNE_INTERVAL = float(os.getenv("FACT_PRUNE_INTERVAL", "3600"))
+
     # Idempotency configuration
     IDEMPOTENCY_COLLECTION = os.getenv("IDEMPOTENCY_COLLECTION", "processed_updates")
 
+    # Set once validate() has succeeded so repeated calls are free
+    _validated = False
+
     @classmethod
     def get_telegram_token(cls, local_mode=False):
         """Get the appropriate Telegram token based on the mode"""
@@ -114,6 +131,9 @@ class Config:
     @classmethod
     def validate(cls):
         """Validate that all required configuration is present"""
+        if cls._validated:
+            return True
+
         missing = []
 
         if not cls.TELEGRAM_BOT_TOKEN:
@@ -146,6 +166,7 @@ class Config:
                 f"Missing required environment variables: {', '.join(missing)}"
             )
 
+        cls._validated = True
         return True
 
 
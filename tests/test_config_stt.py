@@ -183,4 +183,22 @@ def test_telegram_token_attributes():
     
     assert hasattr(Config, 'TELEGRAM_BOT_TOKEN')
     assert hasattr(Config, 'TELEGRAM_BOT_TOKEN_LOCAL')
-    assert hasattr(Config, 'get_telegram_token') 
\ No newline at end of file
+    assert hasattr(Config, 'get_telegram_token') 
+
+def test_config_validation_is_memoized(monkeypatch):
+    """Test that validate() only runs the checks until it first succeeds"""
+    from config import Config
+
+    monkeypatch.setattr(Config, "_validated", False)
+    monkeypatch.setattr(Config, "TELEGRAM_BOT_TOKEN", "t")
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "k")
+    monkeypatch.setattr(Config, "GROQ_API_KEY", "g")
+    monkeypatch.setattr(Config, "GEMINI_API_KEY", "m")
+    monkeypatch.setattr(Config, "FIREBASE_PROJECT_ID", "p")
+    monkeypatch.setattr(Config, "GOOGLE_APPLICATION_CREDENTIALS", "c")
+
+    assert Config.validate() is True
+
+    # Once validated, later calls skip the checks entirely
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", None)
+    assert Config.validate() is True
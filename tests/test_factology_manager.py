@@ -0,0 +1,47 @@
+import os
+from unittest.mock import MagicMock
+
+os.environ.setdefault("TESTING", "True")
+
+from bot.factology_manager import FactologyManager
+
+
+def test_prune_facts_is_debounced_per_user():
+    firestore_client = MagicMock()
+    firestore_client.get_facts.return_value = []
+    manager = FactologyManager(firestore_client, prune_interval=3600)
+
+    manager.prune_facts("1")
+    manager.prune_facts("1")
+    manager.prune_facts("2")
+
+    assert firestore_client.get_facts.call_count == 2
+
+
+def test_prune_facts_runs_every_time_without_interval():
+    firestore_client = MagicMock()
+    firestore_client.get_facts.return_value = []
+    manager = FactologyManager(firestore_client, prune_interval=0)
+
+    manager.prune_facts("1")
+    manager.prune_facts("1")
+
+    assert firestore_client.get_facts.call_count == 2
+
+
+def test_prune_facts_forgets_users_after_interval(monkeypatch):
+    from bot import factology_manager
+
+    clock = [0.0]
+    monkeypatch.setattr(factology_manager.time, "monotonic", lambda: clock[0])
+    firestore_client = MagicMock()
+    firestore_client.get_facts.return_value = []
+    manager = FactologyManager(firestore_client, prune_interval=60)
+
+    manager.prune_facts("1")
+    manager.prune_facts("2")
+    clock[0] = 61.0
+    manager.prune_facts("3")
+
+    assert list(manager._last_pruned) == ["3"]
+    assert firestore_client.get_facts.call_count == 3
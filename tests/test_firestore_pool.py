@@ -0,0 +1,145 @@
+import os
+import sys
+
+os.environ.setdefault("TESTING", "True")
+os.environ.setdefault("FIREBASE_PROJECT_ID", "test_project")
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from unittest.mock import MagicMock
+
+from bot import firestore_client
+
+
+def setup_fake_pool(monkeypatch, size):
+    created = []
+
+    def fake_client(project=None, credentials=None):
+        client = MagicMock()
+        client.credentials = credentials
+        created.append(client)
+        return client
+
+    monkeypatch.setattr(firestore_client, "_pool", [])
+    monkeypatch.setattr(firestore_client, "default", lambda scopes=None: ("creds", "proj"))
+    monkeypatch.setattr(firestore_client.firestore, "Client", fake_client)
+    monkeypatch.setattr(firestore_client.Config, "FIRESTORE_POOL_SIZE", size)
+    return created
+
+
+def test_pool_built_once_with_shared_credentials(monkeypatch):
+    created = setup_fake_pool(monkeypatch, 3)
+
+    firestore_client.get_db()
+    firestore_client.get_db()
+    firestore_client.init_db_pool()
+
+    assert len(created) == 3
+    assert all(client.credentials == "creds" for client in created)
+
+
+def test_get_db_round_robin_skips_health_client(monkeypatch):
+    created = setup_fake_pool(monkeypatch, 3)
+
+    picked = {id(firestore_client.get_db()) for _ in range(4)}
+
+    assert picked == {id(client) for client in created[1:]}
+
+
+def test_get_db_single_client_pool(monkeypatch):
+    created = setup_fake_pool(monkeypatch, 1)
+
+    assert firestore_client.get_db() is created[0]
+
+
+def test_health_db_is_first_client(monkeypatch):
+    created = setup_fake_pool(monkeypatch, 2)
+
+    assert firestore_client.get_health_db() is created[0]
+
+
+def test_system_prompt_is_cached_and_refreshed_on_set(monkeypatch):
+    setup_fake_pool(monkeypatch, 1)
+    monkeypatch.setattr(firestore_client, "_system_prompt_cache", {})
+    client = firestore_client.get_db()
+    doc = client.collection.return_value.document.return_value.get.return_value
+    doc.exists = True
+    doc.to_dict.return_value = {"prompt": "stored"}
+
+    assert firestore_client.get_system_prompt("42") == "stored"
+    assert firestore_client.get_system_prompt("42") == "stored"
+    assert client.collection.return_value.document.return_value.get.call_count == 1
+
+    firestore_client.set_system_prompt("42", "updated")
+
+    assert firestore_client.get_system_prompt("42") == "updated"
+    assert client.collection.return_value.document.return_value.get.call_count == 1
+
+
+def test_user_settings_are_cached_and_written_through(monkeypatch):
+    setup_fake_pool(monkeypatch, 1)
+    monkeypatch.setattr(firestore_client, "_user_settings_cache", {})
+    client = firestore_client.get_db()
+    doc_ref = client.collection.return_value.document.return_value
+    doc_ref.get.return_value.exists = True
+    doc_ref.get.return_value.to_dict.return_value = {"reply_mode": "text"}
+
+    assert firestore_client.get_user_settings("42") == {"reply_mode": "text"}
+    firestore_client.set_user_settings("42", {"reply_mode": "voice"})
+
+    assert firestore_client.get_user_settings("42")["reply_mode"] == "voice"
+    assert doc_ref.get.call_count == 1
+
+
+def test_turn_messages_share_one_transaction(monkeypatch):
+    setup_fake_pool(monkeypatch, 1)
+    calls = []
+
+    def fake_transaction_body(txn, current_db, user_id, messages_data):
+        calls.append(messages_data)
+
+    monkeypatch.setattr(firestore_client, "_add_message_transaction", fake_transaction_body)
+
+    assert firestore_client.add_messages_with_timestamp(
+        "42", [("user", "hi"), ("assistant", "hello")], "ts"
+    )
+    assert len(calls) == 1
+    assert [m["role"] for m in calls[0]] == ["user", "assistant"]
+
+
+def test_recent_history_reads_only_the_tail(monkeypatch):
+    setup_fake_pool(monkeypatch, 1)
+    client = firestore_client.get_db()
+    messages_ref = (
+        client.collection.return_value.document.return_value.collection.return_value
+    )
+    query = messages_ref.order_by.return_value.limit.return_value
+    docs = []
+    for doc_id in ("3", "2"):
+        doc = MagicMock(id=doc_id)
+        doc.to_dict.return_value = {"role": "user", "content": doc_id}
+        docs.append(doc)
+    query.stream.return_value = docs
+
+    history = firestore_client.get_recent_history("42", 2)
+
+    messages_ref.order_by.return_value.limit.assert_called_once_with(2)
+    assert [m["firestore_doc_id"] for m in history] == ["2", "3"]
+
+
+def test_recent_history_retries_and_raises_transient_errors(monkeypatch):
+    import pytest
+
+    setup_fake_pool(monkeypatch, 1)
+    monkeypatch.setattr("bot.retry_utils.time.sleep", lambda _: None)
+    client = firestore_client.get_db()
+    messages_ref = (
+        client.collection.return_value.document.return_value.collection.return_value
+    )
+    query = messages_ref.order_by.return_value.limit.return_value
+    query.stream.side_effect = ConnectionResetError("reset")
+
+    with pytest.raises(ConnectionResetError):
+        firestore_client.get_recent_history("42", 2)
+
+    assert query.stream.call_count == firestore_client.Config.RETRY_ATTEMPTS
@@ -0,0 +1,66 @@
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+os.environ.setdefault("TESTING", "True")
+
+from bot import telegram_router
+
+
+@pytest.mark.asyncio
+async def test_redelivered_update_skips_firestore(monkeypatch):
+    claim = MagicMock(return_value=True)
+    monkeypatch.setattr(telegram_router, "_seen_updates", telegram_router.collections.OrderedDict())
+    monkeypatch.setattr(telegram_router, "try_claim_update", claim)
+    monkeypatch.setattr(
+        telegram_router.Update, "de_json", lambda data, bot: MagicMock(update_id=data["update_id"])
+    )
+    bot = MagicMock()
+    bot.process_update = AsyncMock()
+
+    await telegram_router.handle_update({"update_id": 7, "message": {}}, bot)
+    await telegram_router.handle_update({"update_id": 7, "message": {}}, bot)
+
+    claim.assert_called_once_with(7)
+    bot.process_update.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_update_claimed_elsewhere_is_skipped(monkeypatch):
+    monkeypatch.setattr(telegram_router, "_seen_updates", telegram_router.collections.OrderedDict())
+    monkeypatch.setattr(telegram_router, "try_claim_update", MagicMock(return_value=False))
+    monkeypatch.setattr(
+        telegram_router.Update, "de_json", lambda data, bot: MagicMock(update_id=data["update_id"])
+    )
+    bot = MagicMock()
+    bot.process_update = AsyncMock()
+
+    await telegram_router.handle_update({"update_id": 8, "message": {}}, bot)
+
+    bot.process_update.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_non_message_update_skips_idempotency(monkeypatch):
+    claim = MagicMock(return_value=True)
+    monkeypatch.setattr(telegram_router, "try_claim_update", claim)
+    monkeypatch.setattr(
+        telegram_router.Update, "de_json", lambda data, bot: MagicMock(update_id=data["update_id"])
+    )
+    bot = MagicMock()
+    bot.process_update = AsyncMock()
+
+    await telegram_router.handle_update({"update_id": 9, "message_reaction": {}}, bot)
+
+    claim.assert_not_called()
+    bot.process_update.assert_awaited_once()
+
+
+def test_seen_updates_are_bounded(monkeypatch):
+    monkeypatch.setattr(telegram_router, "_seen_updates", telegram_router.collections.OrderedDict())
+    monkeypatch.setattr(telegram_router, "SEEN_UPDATES_MAX", 2)
+
+    for update_id in (1, 2, 3):
+        telegram_router._remember_update(update_id)
+
+    assert list(telegram_router._seen_updates) == [2, 3]
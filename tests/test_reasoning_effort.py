@@ -0,0 +1,46 @@
+import os
+
+os.environ.setdefault("TESTING", "True")
+
+from bot.openai_client import select_reasoning_effort
+from config import Config
+
+
+def _payload(text):
+    return [
+        {"role": "system", "content": "prompt"},
+        {"role": "user", "content": text},
+    ]
+
+
+def test_short_message_gets_low_effort():
+    assert select_reasoning_effort(_payload("привет")) == "low"
+
+
+def test_long_message_gets_high_effort():
+    text = "a" * (Config.LOW_EFFORT_MAX_CHARS + 1)
+    assert select_reasoning_effort(_payload(text)) == "high"
+
+
+def test_crisis_keywords_get_high_effort():
+    assert select_reasoning_effort(_payload("Не хочу жить")) == "high"
+    assert select_reasoning_effort(_payload("I want to kill myself")) == "high"
+
+
+def test_image_gets_high_effort():
+    assert select_reasoning_effort(_payload("что это?"), image_data=b"img") == "high"
+
+
+def test_async_client_rebuilt_after_shared_http_client_is_closed(monkeypatch):
+    import asyncio
+    from bot import http_client, openai_client
+
+    monkeypatch.setattr(Config, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(openai_client, "_async_client", None)
+
+    first = openai_client.get_async_client()
+    assert openai_client.get_async_client() is first
+
+    asyncio.run(http_client.close_http_client())
+
+    assert openai_client.get_async_client() is not first
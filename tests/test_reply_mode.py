@@ -14,7 +14,7 @@ async def test_voice_reply_mode(monkeypatch):
 
     monkeypatch.setattr('bot.telegram_router.safe_send_message', AsyncMock())
     monkeypatch.setattr('bot.telegram_router.get_facts_async', AsyncMock(return_value=[]))
-    monkeypatch.setattr('bot.telegram_router.get_history_async', AsyncMock(return_value=[]))
+    monkeypatch.setattr('bot.telegram_router.get_recent_history_async', AsyncMock(return_value=[]))
     monkeypatch.setattr('bot.telegram_router.build_o4_mini_payload', lambda *a, **k: [])
     monkeypatch.setattr('bot.telegram_router.get_o4_mini_summary', AsyncMock(return_value=(None, None)))
 
@@ -26,7 +26,7 @@ async def test_voice_reply_mode(monkeypatch):
     fake_tts = AsyncMock(return_value=b"aud")
     monkeypatch.setattr('bot.text_to_speech.generate_speech', fake_tts)
     monkeypatch.setattr('bot.telegram_router.keep_typing', AsyncMock())
-    monkeypatch.setattr('bot.telegram_router.add_message_with_timestamp', lambda *a, **k: None)
+    monkeypatch.setattr('bot.telegram_router.add_messages_with_timestamp', lambda *a, **k: None)
 
     await _process_user_message(context, 1, "u", "hi")
 
@@ -42,7 +42,7 @@ async def test_text_reply_mode(monkeypatch):
 
     monkeypatch.setattr('bot.telegram_router.safe_send_message', send_mock)
     monkeypatch.setattr('bot.telegram_router.get_facts_async', AsyncMock(return_value=[]))
-    monkeypatch.setattr('bot.telegram_router.get_history_async', AsyncMock(return_value=[]))
+    monkeypatch.setattr('bot.telegram_router.get_recent_history_async', AsyncMock(return_value=[]))
     monkeypatch.setattr('bot.telegram_router.build_o4_mini_payload', lambda *a, **k: [])
     monkeypatch.setattr('bot.telegram_router.get_o4_mini_summary', AsyncMock(return_value=(None, None)))
 
@@ -53,9 +53,122 @@ async def test_text_reply_mode(monkeypatch):
     monkeypatch.setattr('bot.telegram_router.get_user_settings', lambda uid: {"reply_mode": "text"})
     monkeypatch.setattr('bot.text_to_speech.generate_speech', AsyncMock())
     monkeypatch.setattr('bot.telegram_router.keep_typing', AsyncMock())
-    monkeypatch.setattr('bot.telegram_router.add_message_with_timestamp', lambda *a, **k: None)
+    monkeypatch.setattr('bot.telegram_router.add_messages_with_timestamp', lambda *a, **k: None)
 
     await _process_user_message(context, 1, "u", "hi")
 
     context.bot.send_voice.assert_not_called()
     assert send_mock.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_messages_of_same_user_are_serialized(monkeypatch):
+    import asyncio
+
+    active = 0
+    max_active = 0
+
+    async def fake_respond(*args, **kwargs):
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    monkeypatch.setattr('bot.telegram_router._respond_to_user_message', fake_respond)
+
+    await asyncio.gather(
+        _process_user_message(None, 1, "u", "first"),
+        _process_user_message(None, 1, "u", "second"),
+    )
+
+    assert max_active == 1
+
+
+@pytest.mark.asyncio
+async def test_next_turn_waits_for_background_history_write(monkeypatch):
+    import time
+    from bot import telegram_router
+
+    written = []
+
+    def slow_write(user_id, messages, timestamp):
+        time.sleep(0.01)
+        written.extend(role for role, _ in messages)
+
+    async def fake_respond(*args, **kwargs):
+        assert written == ["user", "assistant"]
+
+    monkeypatch.setattr('bot.telegram_router.add_messages_with_timestamp', slow_write)
+    monkeypatch.setattr('bot.telegram_router._respond_to_user_message', fake_respond)
+
+    telegram_router._save_turn_in_background("u", "hi", "hello", None)
+    await _process_user_message(None, 1, "u", "next")
+
+
+@pytest.mark.asyncio
+async def test_reply_mode_command_dispatch(monkeypatch):
+    from bot import telegram_router
+
+    set_mode = AsyncMock()
+    monkeypatch.setattr(telegram_router, "_set_reply_mode", set_mode)
+    update = MagicMock()
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    update.effective_message.text = "/auto@therapist_bot"
+    await telegram_router.reply_mode_command(update, context)
+    update.effective_message.text = "/voice"
+    await telegram_router.reply_mode_command(update, context)
+
+    assert [c.args[2] for c in set_mode.call_args_list] == [None, "voice"]
+
+
+@pytest.mark.asyncio
+async def test_fact_management_overlaps_o3_call(monkeypatch):
+    import threading
+    from types import SimpleNamespace
+
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    o3_started = threading.Event()
+    overlapped = []
+
+    def fake_manage_facts(user_id, summary_result):
+        overlapped.append(o3_started.wait(timeout=2))
+
+    class Msg:
+        tool_calls = None
+        content = "hi"
+
+    async def fake_o3(*args, **kwargs):
+        o3_started.set()
+        return Msg()
+
+    summary = SimpleNamespace(summary="s", references=None, reorganisation=None)
+    monkeypatch.setattr('bot.telegram_router.safe_send_message', AsyncMock())
+    monkeypatch.setattr('bot.telegram_router.get_facts_async', AsyncMock(return_value=[]))
+    monkeypatch.setattr('bot.telegram_router.get_recent_history_async', AsyncMock(return_value=[]))
+    monkeypatch.setattr('bot.telegram_router.build_o4_mini_payload', lambda *a, **k: [{}])
+    monkeypatch.setattr('bot.telegram_router.get_o4_mini_summary', AsyncMock(return_value=(summary, None)))
+    monkeypatch.setattr('bot.telegram_router._manage_facts', fake_manage_facts)
+    monkeypatch.setattr('bot.telegram_router.get_o3_response_tool', fake_o3)
+    monkeypatch.setattr('bot.telegram_router.get_user_settings', lambda uid: {"reply_mode": "text"})
+    monkeypatch.setattr('bot.telegram_router.get_system_prompt', lambda uid: "prompt")
+    monkeypatch.setattr('bot.telegram_router.keep_typing', AsyncMock())
+    monkeypatch.setattr('bot.telegram_router.add_messages_with_timestamp', lambda *a, **k: None)
+
+    await _process_user_message(context, 1, "u", "hi")
+
+    assert overlapped == [True]
+
+
+def test_new_user_gets_default_system_prompt(monkeypatch):
+    from bot import telegram_router
+
+    stored = {}
+    monkeypatch.setattr(telegram_router, "get_system_prompt", lambda uid: None)
+    monkeypatch.setattr(telegram_router, "set_system_prompt", lambda uid, p: stored.update({uid: p}))
+
+    prompt = telegram_router._get_or_create_system_prompt("u")
+
+    assert prompt == telegram_router.DEFAULT_SYSTEM_PROMPT
+    assert stored == {"u": prompt}
@@ -0,0 +1,158 @@
+import os
+import pytest
+from types import SimpleNamespace
+
+os.environ.setdefault("TESTING", "True")
+
+from telegram.error import RetryAfter
+
+from bot.retry_utils import get_retry_after
+
+
+def test_get_retry_after_from_telegram_error():
+    assert get_retry_after(RetryAfter(3)) == 3.0
+
+
+def test_get_retry_after_from_response_headers():
+    error = Exception("rate limited")
+    error.response = SimpleNamespace(headers={"Retry-After": "7"})
+
+    assert get_retry_after(error) == 7.0
+
+
+def test_get_retry_after_missing_or_invalid():
+    error = Exception("boom")
+    assert get_retry_after(error) is None
+
+    error.headers = {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}
+    assert get_retry_after(error) is None
+
+
+def test_retry_sync_does_not_retry_permanent_errors(monkeypatch):
+    from bot import retry_utils
+
+    monkeypatch.setattr(retry_utils.time, "sleep", lambda _: None)
+    calls = []
+
+    @retry_utils.retry_sync(max_attempts=3, base_delay=0.01)
+    def broken():
+        calls.append(1)
+        raise ValueError("bad input")
+
+    try:
+        broken()
+    except ValueError:
+        pass
+
+    assert len(calls) == 1
+
+
+def test_retry_sync_retries_transient_errors(monkeypatch):
+    from bot import retry_utils
+
+    monkeypatch.setattr(retry_utils.time, "sleep", lambda _: None)
+    calls = []
+
+    @retry_utils.retry_sync(max_attempts=3, base_delay=0.01)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionResetError("reset")
+        return "ok"
+
+    assert flaky() == "ok"
+    assert len(calls) == 3
+
+
+def test_is_retryable_error_matches_ssl_messages():
+    from bot.retry_utils import is_retryable_error
+
+    assert is_retryable_error(ConnectionResetError())
+    assert is_retryable_error(Exception("EOF occurred in violation of protocol"))
+    assert is_retryable_error(Exception("Connection Aborted by peer"))
+    assert not is_retryable_error(Exception("document not found"))
+
+
+@pytest.mark.asyncio
+async def test_retry_async_per_attempt_timeout(monkeypatch):
+    import asyncio
+    from bot import retry_utils
+
+    async def no_sleep(_):
+        return None
+
+    calls = []
+
+    @retry_utils.retry_async(max_attempts=2, per_attempt_timeout=0.01)
+    async def hangs():
+        calls.append(1)
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(retry_utils.asyncio, "sleep", no_sleep)
+
+    with pytest.raises(TimeoutError):
+        await hangs()
+
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_async_stops_when_update_budget_is_spent():
+    import asyncio
+    from bot import retry_utils
+
+    calls = []
+
+    @retry_utils.retry_async(max_attempts=3)
+    async def flaky():
+        calls.append(1)
+        raise ConnectionResetError("reset")
+
+    loop = asyncio.get_running_loop()
+    with retry_utils.retry_deadline(loop.time()):
+        with pytest.raises(ConnectionResetError):
+            await flaky()
+
+    assert len(calls) == 1
+    assert retry_utils.get_retry_deadline() is None
+
+
+@pytest.mark.asyncio
+async def test_retry_async_deadline_never_cuts_retry_after(monkeypatch):
+    import asyncio
+    from bot import retry_utils
+
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(retry_utils.asyncio, "sleep", fake_sleep)
+    calls = []
+
+    @retry_utils.retry_async(max_attempts=3)
+    async def rate_limited():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RetryAfter(4)
+        raise RetryAfter(30)
+
+    loop = asyncio.get_running_loop()
+    with retry_utils.retry_deadline(loop.time() + 10):
+        with pytest.raises(RetryAfter):
+            await rate_limited()
+
+    # Waits the full 4s, then gives up rather than retrying a 30s limit early
+    assert sleeps == [4.0]
+    assert len(calls) == 2
+
+
+def test_get_retry_delay_tables_match_formula():
+    from bot.retry_utils import get_retry_delay
+
+    assert get_retry_delay(1, 2.0, ConnectionResetError()) == 2.0
+    assert get_retry_delay(3, 2.0, ConnectionResetError()) == 2.0 * 1.5 ** 2
+    assert get_retry_delay(20, 2.0, ConnectionResetError()) == 30.0
+    assert get_retry_delay(4, 1.0, RuntimeError("boom")) == 8.0
+    # Attempt 0 clamps to the first delay instead of wrapping to the last table entry
+    assert get_retry_delay(0, 2.0, ConnectionResetError()) == 2.0
@@ -0,0 +1,53 @@
+import pytest
+from pydantic import ValidationError
+
+from bot.schemas import AnalysisResult, Factology, ResponseMode
+
+
+def test_factology_accepts_description_alias():
+    fact = Factology.model_validate(
+        {"category": "emotions", "description": "User feels calmer.", "priority": "high"}
+    )
+
+    assert fact.content == "User feels calmer."
+    assert fact.priority == "High"
+
+
+def test_factology_requires_content():
+    with pytest.raises(ValidationError):
+        Factology.model_validate({"category": "emotions", "priority": "Low"})
+
+
+def test_analysis_result_accepts_text_to_client_alias():
+    result = AnalysisResult.model_validate_json(
+        '{"text_to_client": "I hear you.", "response_mode": "text", "factology": null}'
+    )
+
+    assert result.response == "I hear you."
+    assert result.response_mode == ResponseMode.TEXT
+
+
+def test_analysis_result_requires_response():
+    with pytest.raises(ValidationError):
+        AnalysisResult.model_validate({"response_mode": "voice"})
+
+
+def test_factology_null_content_falls_back_to_description():
+    fact = Factology.model_validate_json(
+        '{"category": "emotions", "content": null, "description": "User feels calmer.", "priority": "Low"}'
+    )
+
+    assert fact.content == "User feels calmer."
+
+
+def test_factology_rejects_null_content_without_description():
+    with pytest.raises(ValidationError):
+        Factology.model_validate({"category": "emotions", "content": None, "priority": "Low"})
+
+
+def test_analysis_result_null_response_falls_back_to_text_to_client():
+    result = AnalysisResult.model_validate_json(
+        '{"response": null, "text_to_client": "I hear you.", "factology": null}'
+    )
+
+    assert result.response == "I hear you."
@@ -0,0 +1,179 @@
+import os
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from telegram.ext import ContextTypes
+
+os.environ.setdefault("TESTING", "True")
+
+from bot.telegram_router import StreamingReply, extract_partial_reply
+from bot.openai_client import _collect_stream
+
+
+def test_extract_partial_reply():
+    assert extract_partial_reply('{"resp') is None
+    assert extract_partial_reply('{"response": "Hel') == "Hel"
+    assert extract_partial_reply('{"response": "Hel\\') == "Hel"
+    assert extract_partial_reply('{"response": "a\\u04') == "a"
+    assert extract_partial_reply('{"response": "a\\u0410b') == "aАb"
+    assert extract_partial_reply('{"response": "one\\ntwo", "response_mode": "text"}') == "one\ntwo"
+    assert extract_partial_reply('{"text_to_client": "hi') == "hi"
+
+
+def _chunk(arguments=None, content=None, name=None):
+    tool_calls = None
+    if arguments is not None or name is not None:
+        tool_calls = [
+            SimpleNamespace(
+                index=0,
+                id="call_1" if name else None,
+                function=SimpleNamespace(name=name, arguments=arguments),
+            )
+        ]
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+async def _stream(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+@pytest.mark.asyncio
+async def test_collect_stream_assembles_tool_call():
+    on_delta = AsyncMock()
+    chunks = [
+        _chunk(name="process_user_message", arguments=""),
+        _chunk(arguments='{"response": "He'),
+        _chunk(arguments='llo"}'),
+    ]
+
+    message = await _collect_stream(_stream(chunks), on_delta)
+
+    assert message.content is None
+    assert message.tool_calls[0].id == "call_1"
+    assert message.tool_calls[0].function.name == "process_user_message"
+    assert message.tool_calls[0].function.arguments == '{"response": "Hello"}'
+    on_delta.assert_called_with('{"response": "Hello"}')
+
+
+async def _let_preview_run():
+    import asyncio
+
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_edits_single_message(monkeypatch):
+    monkeypatch.setattr("bot.telegram_router.STREAM_EDIT_INTERVAL", 0)
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    context.bot.send_message = AsyncMock(return_value=SimpleNamespace(message_id=7))
+    context.bot.edit_message_text = AsyncMock()
+
+    reply = StreamingReply(context, 1)
+    await reply.update('{"response": "Hel')
+    await _let_preview_run()
+    await reply.update('{"response": "Hello')
+    await _let_preview_run()
+    assert await reply.finish("Hello there") is True
+
+    context.bot.send_message.assert_called_once_with(chat_id=1, text="Hel")
+    assert context.bot.edit_message_text.call_count == 2
+    context.bot.edit_message_text.assert_called_with(chat_id=1, message_id=7, text="Hello there")
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_without_preview_falls_back():
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+
+    reply = StreamingReply(context, 1)
+
+    assert await reply.finish("Hello") is False
+
+
+@pytest.mark.asyncio
+async def test_pacer_holds_all_senders_after_retry_after(monkeypatch):
+    from telegram.error import RetryAfter
+    from bot import telegram_router
+
+    clock = [100.0]
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(telegram_router.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(telegram_router.asyncio, "sleep", fake_sleep)
+    pacer = telegram_router.TelegramPacer(2)
+
+    with pytest.raises(RetryAfter):
+        async with pacer:
+            raise RetryAfter(3)
+
+    async with pacer:
+        pass
+
+    assert sleeps == [3.0]
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_failed_final_edit_falls_back():
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    context.bot.send_message = AsyncMock(return_value=SimpleNamespace(message_id=7))
+    context.bot.edit_message_text = AsyncMock(side_effect=RuntimeError("flood"))
+    context.bot.delete_message = AsyncMock()
+
+    reply = StreamingReply(context, 1)
+    await reply._show("Hel")
+
+    assert await reply.finish("Hello there") is False
+    context.bot.delete_message.assert_called_once_with(chat_id=1, message_id=7)
+
+
+@pytest.mark.asyncio
+async def test_streaming_reply_update_does_not_wait_for_telegram(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr("bot.telegram_router.STREAM_EDIT_INTERVAL", 0)
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    release = asyncio.Event()
+
+    async def slow_send(**kwargs):
+        await release.wait()
+        return SimpleNamespace(message_id=7)
+
+    context.bot.send_message = AsyncMock(side_effect=slow_send)
+    context.bot.edit_message_text = AsyncMock()
+
+    reply = StreamingReply(context, 1)
+    await reply.update('{"response": "Hel')
+    await _let_preview_run()
+    # The stream keeps being read while the first send is still pending
+    await asyncio.wait_for(reply.update('{"response": "Hello'), timeout=1)
+
+    release.set()
+    assert await reply.finish("Hello there") is True
+    context.bot.send_message.assert_called_once_with(chat_id=1, text="Hel")
+    context.bot.edit_message_text.assert_called_with(chat_id=1, message_id=7, text="Hello there")
+
+
+@pytest.mark.asyncio
+async def test_safe_send_message_resumes_from_failed_chunk(monkeypatch):
+    from bot import telegram_router
+
+    async def no_sleep(_):
+        return None
+
+    monkeypatch.setattr(telegram_router, "split_long_message", lambda text: ["one", "two"])
+    monkeypatch.setattr("bot.retry_utils.asyncio.sleep", no_sleep)
+    context = MagicMock(spec=ContextTypes.DEFAULT_TYPE)
+    context.bot.send_message = AsyncMock(
+        side_effect=[SimpleNamespace(message_id=1), ConnectionResetError("reset"), SimpleNamespace(message_id=2)]
+    )
+
+    last = await telegram_router.safe_send_message(context, 1, "one two")
+
+    assert last.message_id == 2
+    assert [c.kwargs["text"] for c in context.bot.send_message.call_args_list] == ["one", "two", "two"]
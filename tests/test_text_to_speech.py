@@ -72,3 +72,28 @@ def test_convert_l16_to_wav_different_sample_rates():
         assert wav_data[:4] == b'RIFF'
         assert wav_data[8:12] == b'WAVE'
         assert len(wav_data) == 44 + len(pcm_data)
+
+@pytest.mark.asyncio
+async def test_generate_speech_uses_shared_http_client(monkeypatch):
+    """TTS requests go through the pooled HTTP client."""
+    from unittest.mock import AsyncMock, MagicMock
+    from bot import text_to_speech
+
+    pcm_data = b'\x00\x01' * 10
+    response = MagicMock(status_code=200)
+    response.json.return_value = {
+        "candidates": [{"content": {"parts": [{"inlineData": {
+            "data": base64.b64encode(pcm_data).decode(),
+            "mimeType": "audio/L16;rate=16000",
+        }}]}}]
+    }
+    client = MagicMock()
+    client.post = AsyncMock(return_value=response)
+    monkeypatch.setattr(text_to_speech, "get_http_client", lambda: client)
+    monkeypatch.setattr(Config, "GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(Config, "GEMINI_TTS_URL", "https://test.com/tts")
+
+    wav_data = await generate_speech("Hello world")
+
+    client.post.assert_awaited_once()
+    assert wav_data == convert_l16_to_wav(pcm_data, sample_rate=16000)